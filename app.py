@@ -1,10 +1,27 @@
 import os
+import time
+import threading
 import numpy as np
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, send_file, send_from_directory, g
+from sqlalchemy import and_, or_
 from datetime import datetime
-from models import db, ClothingItem, OutfitHistory
-from recommender import recommend_outfits
-from scripts.classify_helper import load_classifier, predict_category
+from database import DATABASE_URL, engine_options, attach, file_backed
+from models import db, ClothingItem, OutfitHistory, OutfitHistoryItem, ItemTombstone
+from migrations import run_migrations
+from recommender import recommend_outfits, ranking_cache, outfit_items, current_model
+from compatibility import compatibility, partner_categories
+from categories import normalize
+from novelty import novelty_index
+from wardrobe import wardrobe
+from classify_pool import ClassificationPool, PENDING, classify_status
+from write_buffer import WriteBuffer, write_counters
+from embedding_store import embedding_store
+from image_store import save_upload, pregenerate, thumbnail, pick_size, remove_thumbnails, FORMATS
+import image_store
+import metrics
+from metrics import span
 
 
 UPLOAD_FOLDER = 'uploads'
@@ -13,17 +30,103 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(EMBED_FOLDER, exist_ok=True)
 
 app = Flask(__name__, static_folder='static', template_folder='static')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///smartoutfit.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(DATABASE_URL)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# request bodies are cut off above this, also chunked ones under asgi.py
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("SMARTOUTFIT_MAX_REQUEST_MB", 32)) * 1024 * 1024
 db.init_app(app)
 
-try:
-    load_classifier()
-except Exception:
-    pass
-
 with app.app_context():
+    attach(db.engine)
     db.create_all()
+    run_migrations()
+    wardrobe.init_state()
+    # close the setup connections so workers forked after import (gunicorn
+    # --preload) open their own instead of sharing the master's
+    if file_backed(DATABASE_URL):
+        db.engine.dispose()
+
+# ---------- MODELS ----------
+# torch/torchvision and the pickled ranking model load on first use, so a
+# worker boots without them. SMARTOUTFIT_PRELOAD=1 loads both at import
+# instead; under gunicorn --preload that happens once in the master and the
+# forked workers share the pages copy-on-write.
+
+def classify_batch(paths):
+    from scripts.classify_helper import predict_with_embeddings
+    return predict_with_embeddings(paths)
+
+
+def preload_models():
+    current_model()
+    try:
+        from scripts.classify_helper import load_classifier
+        load_classifier()
+    except Exception:
+        pass
+
+
+if os.environ.get("SMARTOUTFIT_PRELOAD") == "1":
+    preload_models()
+
+classify_pool = ClassificationPool(app, classify_batch, embeddings=embedding_store)
+write_buffer = WriteBuffer(app)
+
+
+@app.before_request
+def start_classify_pool():
+    # no-op after the first request of each process
+    classify_pool.start()
+
+# ---------- METRICS ----------
+# Per-endpoint latency plus the stage spans recorded by the recommender,
+# the upload path and the classification pool; see metrics.py.
+
+REQUEST_SECONDS = metrics.histogram("smartoutfit_request_seconds", "Request latency by endpoint.", "endpoint")
+UPLOADS = metrics.counter("smartoutfit_uploads_total", "Uploads by outcome.", "result")
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    start = g.get("request_start")
+    if start is not None and metrics.ENABLED:
+        REQUEST_SECONDS.labels(request.endpoint or "unmatched").observe(time.perf_counter() - start)
+    return response
+
+
+def _app_metrics():
+    ranking = ranking_cache.stats()
+    caches = {
+        "ranking": (ranking["hits"], ranking["misses"]),
+        "thumbnail": (image_store.thumbnail_hits.value, image_store.thumbnail_misses.value),
+    }
+    return [
+        ("smartoutfit_cache_hits_total", "counter", "Cache lookups that found an entry.",
+         [({"cache": c}, hits) for c, (hits, _) in caches.items()]),
+        ("smartoutfit_cache_misses_total", "counter", "Cache lookups that missed.",
+         [({"cache": c}, misses) for c, (_, misses) in caches.items()]),
+        ("smartoutfit_cache_hit_ratio", "gauge", "Hits over lookups since the process started.",
+         [({"cache": c}, hits / (hits + misses) if hits + misses else 0.0) for c, (hits, misses) in caches.items()]),
+        ("smartoutfit_ranking_cache_entries", "gauge", "Rankings currently cached.", [({}, ranking["size"])]),
+        ("smartoutfit_novelty_outfits", "gauge", "Outfits in the novelty window.", [({}, len(novelty_index))]),
+        ("smartoutfit_classify_queue", "gauge", "Uploads waiting for the classifier.", [({}, classify_pool.backlog())]),
+        ("smartoutfit_write_buffer", "gauge", "Writes waiting for the next flush.", [({}, write_buffer.backlog())]),
+    ]
+
+
+metrics.register(_app_metrics)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 
 @app.route('/')
 def index():
@@ -38,63 +141,235 @@ def upload():
 
     filename = f"{int(datetime.utcnow().timestamp()*1000)}_{f.filename}"
     path = os.path.join(UPLOAD_FOLDER, filename)
-    f.save(path)
-
-    # TEMPORARY SAFE EMBEDDING
-    embedding = np.zeros(512)
+    with span("upload.save"):
+        content_hash = save_upload(f.stream, path)
+
+    # the same bytes again: point at the existing item instead of classifying twice
+    with span("upload.dedup"):
+        existing = (
+            db.session.query(ClothingItem.id, ClothingItem.category)
+            .filter(ClothingItem.content_hash == content_hash)
+            .order_by(ClothingItem.id)
+            .first()
+        )
+    if existing:
+        os.remove(path)
+        UPLOADS.labels("duplicate").inc()
+        return jsonify({
+            "id": existing.id,
+            "status": classify_status(existing.category),
+            "duplicate": True
+        })
 
-    emb_path = os.path.join(EMBED_FOLDER, filename + ".npy")
-    np.save(emb_path, embedding)
+    # backpressure: refuse the upload while the classifier is saturated
+    if not classify_pool.reserve():
+        os.remove(path)
+        UPLOADS.labels("busy").inc()
+        resp = jsonify({"error": "classifier busy, retry shortly"})
+        resp.headers["Retry-After"] = "2"
+        return resp, 503
 
     try:
-        predicted = predict_category(path)
+        # the embedding is written to the shared store by the classification pool
+        item = ClothingItem(
+            filename=filename,
+            path=path,
+            embedding_path=embedding_store.vectors_path,
+            category=PENDING,
+            color="unknown",
+            times_worn=0,
+            favorited=False,
+            content_hash=content_hash,
+            classify_claimed_at=datetime.utcnow()   # this process classifies it
+        )
+
+        with span("upload.commit"):
+            db.session.add(item)
+            pending = wardrobe.stage(changed=[item])
+            db.session.commit()
+            wardrobe.apply(pending)
     except Exception:
-        predicted = "unknown"
-
-    item = ClothingItem(
-        filename=filename,
-        path=path,
-        embedding_path=emb_path,
-        category=predicted,
-        color="unknown",
-        times_worn=0,
-        favorited=False
-    )
+        classify_pool.release()
+        raise
 
-    db.session.add(item)
-    db.session.commit()
-    return jsonify({"id": item.id})
+    pregenerate(path, content_hash)
+    classify_pool.submit(item.id, path)
+    UPLOADS.labels("accepted").inc()
+    return jsonify({"id": item.id, "status": PENDING}), 202
+
+@app.route('/api/upload_status/<int:item_id>')
+def upload_status(item_id):
+    item = ClothingItem.query.get(item_id)
+    if not item:
+        return jsonify({"error": "not found"}), 404
+
+    return jsonify({
+        "id": item.id,
+        "status": classify_status(item.category),
+        "category": item.category,
+        "queued": classify_pool.backlog()
+    })
 
 # ---------- ITEMS ----------
+# Served from the wardrobe snapshot, in id order, one page per request:
+#   ?limit=N&after=ID   page after the item ID (X-Next-Cursor holds the next
+#                       value; absent on the last page)
+#   ?category=C         items with exactly this category: the snapshot's rows of
+#                       its normalized category (all rows for pending/unknown)
+#                       masked by the exact category's code
+#   ?fields=id,category only these keys per item
+#   ?since=VERSION      {"version", "changed", "deleted"}: what changed after
+#                       VERSION, for patching a list fetched earlier
+# The ETag is the wardrobe version (also sent as X-Wardrobe-Version), so an
+# unchanged wardrobe revalidates with a 304.
+ITEMS_PAGE_SIZE = 200
+ITEMS_MAX_PAGE_SIZE = 1000
+
+ITEM_FIELDS = {
+    "id": lambda view, r: int(view.ids[r]),
+    "url": lambda view, r: f"/image/{int(view.ids[r])}",
+    "category": lambda view, r: view.category[r],
+    "times_worn": lambda view, r: int(view.times_worn[r]),
+    "favorited": lambda view, r: bool(view.favorited[r]),
+}
+
+
+def _int(value):
+    # ids are JSON integers or digit strings; anything else (1.5, true, [1]) is None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        return int(value)
+    return None
+
+
+def _find_row(view, item_id):
+    # snapshot row of a live item, or None
+    item_id = _int(item_id)
+    if item_id is None:
+        return None
+    found = np.flatnonzero((view.ids[:view.size] == item_id) & view.alive[:view.size])
+    return int(found[0]) if len(found) else None
+
+
+def _category_rows(view, category):
+    code = view.cat_codes.get(category)
+    if code is None:
+        return np.empty(0, dtype=np.int64)
+    norm = normalize(category)
+    if norm:
+        rows = view.by_cat.get(norm, np.empty(0, dtype=np.int64))
+        return rows[view.cat[rows] == code]
+    return np.flatnonzero((view.cat[:view.size] == code) & view.alive[:view.size])
+
+
+def _serialize(view, rows, fields):
+    getters = [(name, ITEM_FIELDS[name]) for name in fields]
+    return [{name: get(view, r) for name, get in getters} for r in rows]
+
+
+def _items_since(view, since, fields):
+    # changes up to the snapshot's own version, so the answer matches it
+    changed = {
+        item_id for (item_id,) in db.session.query(ClothingItem.id)
+        .filter(ClothingItem.version > since, ClothingItem.version <= view.version)
+    }
+    deleted = [
+        item_id for (item_id,) in db.session.query(ItemTombstone.item_id)
+        .filter(ItemTombstone.version > since, ItemTombstone.version <= view.version)
+        .order_by(ItemTombstone.item_id)
+        if item_id not in changed   # id reused by a later upload
+    ]
+    ids = view.ids[:view.size]
+    rows = np.flatnonzero(np.isin(ids, list(changed)) & view.alive[:view.size])
+    rows = rows[np.argsort(ids[rows], kind="stable")]
+    return {"version": view.version, "changed": _serialize(view, rows, fields), "deleted": deleted}
+
+
 @app.route('/api/items')
 def items():
-    return jsonify([
-        {
-            "id": it.id,
-            "url": f"/image/{it.id}",
-            "category": it.category,
-            "times_worn": it.times_worn,
-            "favorited": bool(it.favorited)
-        }
-        for it in ClothingItem.query.all()
-    ])
+    # this process's buffered clicks are part of the answer (and the version);
+    # with none buffered, a revalidation is answered without a commit
+    if write_buffer.item_writes():
+        write_buffer.flush()
+    view = wardrobe.view()
+    etag = f"items-{view.version}"
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    fields = request.args.get('fields')
+    fields = fields.split(",") if fields else list(ITEM_FIELDS)
+    unknown = [f for f in fields if f not in ITEM_FIELDS]
+    if unknown:
+        return jsonify({"error": f"unknown fields: {','.join(unknown)}"}), 400
+
+    since = request.args.get('since', type=int)
+    if since is not None:
+        resp = jsonify(_items_since(view, since, fields))
+    else:
+        limit = min(max(request.args.get('limit', ITEMS_PAGE_SIZE, type=int), 1), ITEMS_MAX_PAGE_SIZE)
+        after = request.args.get('after', 0, type=int)
+        category = request.args.get('category')
+        rows = _category_rows(view, category) if category else np.flatnonzero(view.alive[:view.size])
+        ids = view.ids[rows]
+        rows, ids = rows[ids > after], ids[ids > after]
+        if len(rows) > limit:
+            keep = np.argpartition(ids, limit - 1)[:limit]
+            rows, ids = rows[keep], ids[keep]
+        order = np.argsort(ids, kind="stable")
+        rows, ids = rows[order], ids[order]
+
+        resp = jsonify(_serialize(view, rows, fields))
+        if len(rows) == limit:
+            resp.headers["X-Next-Cursor"] = str(int(ids[-1]))
+    resp.headers["X-Wardrobe-Version"] = str(view.version)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.set_etag(etag)
+    return resp
+
+# ---------- IMAGES ----------
+# ?size=N serves the smallest stored thumbnail of at least N px, as WebP when
+# the browser accepts it. Responses carry an ETag derived from the content
+# hash, so revalidation ends in a 304 without sending the image again.
+
+IMAGE_MAX_AGE = int(os.environ.get("SMARTOUTFIT_IMAGE_MAX_AGE", 0))
+
 
 @app.route('/image/<int:item_id>')
 def image(item_id):
-    item = ClothingItem.query.get_or_404(item_id)
-    return send_file(item.path)
+    item = (
+        db.session.query(ClothingItem.path, ClothingItem.content_hash)
+        .filter(ClothingItem.id == item_id)
+        .first()
+    )
+    if item is None:
+        return jsonify({"error": "not found"}), 404
+
+    size = request.args.get('size', type=int)
+    if size and item.content_hash:
+        size = pick_size(size)
+        fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+        try:
+            path = thumbnail(item.path, item.content_hash, size, fmt)
+        except Exception:
+            path = None   # undecodable image: fall back to the original
+        if path:
+            resp = send_file(path, mimetype=FORMATS[fmt][1], etag=f"{item.content_hash}-{size}-{fmt}",
+                             max_age=IMAGE_MAX_AGE)
+            resp.vary.add("Accept")
+            return resp
+
+    return send_file(item.path, etag=item.content_hash or True, max_age=IMAGE_MAX_AGE)
 
 # ---------- UPDATE CATEGORY ----------
 @app.route('/api/update_category', methods=['POST'])
 def update_category():
     body = request.json or {}
-    item = ClothingItem.query.get(body.get('item_id'))
-    if not item:
-        return jsonify({"error": "not found"}), 404
-
-    item.category = body.get('category')
-    db.session.commit()
-    return jsonify({"ok": True})
+    return _single_op({"op": "update_category", "item_id": body.get('item_id'), "category": body.get('category')})
 
 # ---------- RECOMMEND ----------
 @app.route('/api/recommend', methods=['POST'])
@@ -105,108 +380,300 @@ def recommend():
 
     recs = recommend_outfits(event=event, weather=weather, k=3)
 
-    for outfit in recs:
-        item_ids = [str(item["id"]) for item in outfit["items"]]
-
-        history_entry = OutfitHistory(
-            event=event,
-            weather=weather,
-            items_used=",".join(item_ids),
-            justification=outfit["justification"]
-        )
-
-        db.session.add(history_entry)
-
-    db.session.commit()
+    created_at = datetime.utcnow()
+    with span("recommend.history_write"):
+        for outfit in recs:
+            item_ids = [item["id"] for item in outfit["items"]]
+            write_buffer.add_history(event, weather, outfit["justification"], created_at, item_ids)
+            novelty_index.record(item_ids, created_at)
 
     return jsonify({
         "outfits": recs,
         "message": "ok" if recs else "No suitable outfits found"
     })
 
+# ---------- MATCHES ----------
+@app.route('/api/matches/<int:item_id>')
+def matches(item_id):
+    view = wardrobe.view()
+    r = _find_row(view, item_id)
+    if r is None:
+        return jsonify({"error": "not found"}), 404
+
+    compat = compatibility(view)
+    k = request.args.get('k', 5, type=int)
+    norm = normalize(view.category[r])
+    categories = [request.args['category']] if 'category' in request.args else partner_categories(norm)
+
+    result = {}
+    for cat in categories:
+        found = compat.best_matches(r, normalize(cat) or cat, k)
+        result[cat] = [
+            dict(outfit_items(view, [row])[0], similarity=round(sim, 4))
+            for row, sim in found
+        ]
+    return jsonify({"id": item_id, "matches": result})
+
+# ---------- CACHE STATS ----------
+@app.route('/api/cache_stats')
+def cache_stats():
+    return jsonify({"ranking": ranking_cache.stats()})
+
 # ---------- HISTORY ----------
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def _history_cursor(created_at, history_id):
+    return f"{created_at.isoformat()},{history_id}"
+
+
 @app.route('/api/history')
 def history():
-    history_entries = OutfitHistory.query.order_by(OutfitHistory.created_at.desc()).all()
+    # newest first, one page per request; X-Next-Cursor is passed back as
+    # ?before= to get the next page and is absent on the last one
+    write_buffer.flush()
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+
+    page = db.session.query(OutfitHistory.id)
+    before = request.args.get('before')
+    if before:
+        try:
+            created_at, history_id = before.rsplit(",", 1)
+            created_at, history_id = datetime.fromisoformat(created_at), int(history_id)
+        except ValueError:
+            return jsonify({"error": "bad cursor"}), 400
+        page = page.filter(or_(
+            OutfitHistory.created_at < created_at,
+            and_(OutfitHistory.created_at == created_at, OutfitHistory.id < history_id),
+        ))
+    page = page.order_by(OutfitHistory.created_at.desc(), OutfitHistory.id.desc()).limit(limit).subquery()
+
+    # one query for the page, its items and whether each item still exists
+    rows = (
+        db.session.query(
+            OutfitHistory.id, OutfitHistory.event, OutfitHistory.weather,
+            OutfitHistory.justification, OutfitHistory.created_at, ClothingItem.id,
+        )
+        .join(page, page.c.id == OutfitHistory.id)
+        .outerjoin(OutfitHistoryItem, OutfitHistoryItem.history_id == OutfitHistory.id)
+        .outerjoin(ClothingItem, ClothingItem.id == OutfitHistoryItem.item_id)
+        .order_by(OutfitHistory.created_at.desc(), OutfitHistory.id.desc(), OutfitHistoryItem.position)
+        .all()
+    )
 
     result = []
-
-    for entry in history_entries:
-        item_ids = entry.items_used.split(",")
-        items = []
-
-        for item_id in item_ids:
-            item = ClothingItem.query.get(int(item_id))
-            if item:
-                items.append({
-                    "id": item.id,
-                    "url": f"/image/{item.id}"
-                })
-
-        result.append({
-            "id": entry.id,
-            "event": entry.event,
-            "weather": entry.weather,
-            "items": items,
-            "justification": entry.justification,
-            "created_at": entry.created_at.strftime("%Y-%m-%d %H:%M")
-        })
-
-    return jsonify(result)
+    last = None
+    for history_id, event, weather, justification, created_at, item_id in rows:
+        if not result or result[-1]["id"] != history_id:
+            result.append({
+                "id": history_id,
+                "event": event,
+                "weather": weather,
+                "items": [],
+                "justification": justification,
+                "created_at": created_at.strftime("%Y-%m-%d %H:%M")
+            })
+            last = (created_at, history_id)
+        if item_id is not None:
+            result[-1]["items"].append({
+                "id": item_id,
+                "url": f"/image/{item_id}"
+            })
+
+    resp = jsonify(result)
+    if len(result) == limit:
+        resp.headers["X-Next-Cursor"] = _history_cursor(*last)
+    return resp
 
 # ---------- DELETE HISTORY ----------
 @app.route('/api/delete_history', methods=['POST'])
 def delete_history():
-    entry = OutfitHistory.query.get(request.json.get('history_id'))
-    if not entry:
-        return jsonify({"error": "not found"}), 404
-
-    db.session.delete(entry)
-    db.session.commit()
-    return jsonify({"ok": True})
+    return _single_op({"op": "delete_history", "history_id": (request.json or {}).get('history_id')})
 
 
 
 # ---------- WORN ----------
 @app.route('/api/mark_worn', methods=['POST'])
 def mark_worn():
-    item = ClothingItem.query.get(request.json.get('item_id'))
-    if not item:
+    view = wardrobe.view()
+    r = _find_row(view, request.json.get('item_id'))
+    if r is None:
         return jsonify({"error": "not found"}), 404
 
-    item.times_worn += 1
-    db.session.commit()
+    write_buffer.add_worn(int(view.ids[r]))
     return jsonify({"ok": True})
 
 # ---------- FAVORITE ----------
 @app.route('/api/favorite', methods=['POST'])
 def favorite():
-    item = ClothingItem.query.get(request.json.get('item_id'))
-    if not item:
+    view = wardrobe.view()
+    r = _find_row(view, request.json.get('item_id'))
+    if r is None:
         return jsonify({"error": "not found"}), 404
 
-    item.favorited = not item.favorited
-    db.session.commit()
+    write_buffer.toggle_favorite(int(view.ids[r]))
     return jsonify({"ok": True})
 
 # ---------- DELETE ----------
 @app.route('/api/delete_item', methods=['POST'])
 def delete_item():
-    item = ClothingItem.query.get(request.json.get('item_id'))
-    if not item:
-        return jsonify({"error": "not found"}), 404
+    return _single_op({"op": "delete_item", "item_id": (request.json or {}).get('item_id')})
+
+# ---------- BATCH ----------
+# POST {"ops": [{"op": "update_category", "item_id": 1, "category": "shirt"},
+#               {"op": "mark_worn", "item_id": 2}, {"op": "favorite", "item_id": 2},
+#               {"op": "delete_item", "item_id": 3}, {"op": "delete_history", "history_id": 4}]}
+# Valid ops are applied in order, in one transaction; the answer has one
+# result per op: {"ok": true} or {"error": ..., "status": 404}. An op does
+# not see items deleted earlier in the batch. Files, thumbnails and
+# embeddings of deleted items are removed after the commit, in the background.
+BATCH_MAX_OPS = 1000
+BATCH_OPS = {"update_category", "mark_worn", "favorite", "delete_item", "delete_history"}
+
+
+def _apply_ops(ops):
+    # buffered history and clicks are written first, so ops see them
+    write_buffer.flush()
+    item_ids = {_int(op.get("item_id")) for op in ops} - {None}
+    history_ids = {_int(op.get("history_id")) for op in ops if op.get("op") == "delete_history"} - {None}
+    items = {it.id: it for it in ClothingItem.query.filter(ClothingItem.id.in_(item_ids))} if item_ids else {}
+    entries = {h.id: h for h in OutfitHistory.query.filter(OutfitHistory.id.in_(history_ids))} if history_ids else {}
+
+    results = []
+    changed, removed = {}, {}
+    worn, toggles = Counter(), Counter()
+    history_deleted = False
+    for op in ops:
+        kind = op.get("op")
+        if not isinstance(kind, str) or kind not in BATCH_OPS:
+            results.append({"error": f"unknown op: {kind}", "status": 400})
+            continue
+        key = "history_id" if kind == "delete_history" else "item_id"
+        if _int(op.get(key)) is None:
+            results.append({"error": f"{key} must be an integer", "status": 400})
+            continue
+        if kind == "delete_history":
+            entry = entries.pop(_int(op.get("history_id")), None)
+            if entry is None:
+                results.append({"error": "not found", "status": 404})
+                continue
+            db.session.delete(entry)
+            history_deleted = True
+            results.append({"ok": True})
+            continue
+
+        item = items.get(_int(op.get("item_id")))
+        if item is None or item.id in removed:
+            results.append({"error": "not found", "status": 404})
+            continue
+        if kind == "update_category":
+            category = op.get("category")
+            if not category or not isinstance(category, str):
+                results.append({"error": "category required", "status": 400})
+                continue
+            item.category = category
+        elif kind == "mark_worn":
+            worn[item.id] += 1
+        elif kind == "favorite":
+            toggles[item.id] += 1
+        elif kind == "delete_item":
+            db.session.delete(item)
+            removed[item.id] = item
+            changed.pop(item.id, None)
+            results.append({"ok": True})
+            continue
+        changed[item.id] = item
+        results.append({"ok": True})
+
+    if not (changed or removed or history_deleted):
+        return results
 
-    if os.path.exists(item.path):
-        os.remove(item.path)
-    if item.embedding_path and os.path.exists(item.embedding_path):
-        os.remove(item.embedding_path)
+    try:
+        db.session.flush()
+        worn = {i: n for i, n in worn.items() if i not in removed}
+        toggles = {i: n for i, n in toggles.items() if i not in removed}
+        write_counters(worn, toggles)
+        for i in set(worn) | set(toggles):
+            db.session.expire(items[i], ["times_worn", "favorited"])
+        cleanup = _cleanup_job(removed.values())
+        pending = wardrobe.stage(changed=list(changed.values()), removed=list(removed)) if changed or removed else None
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if pending is not None:
+        wardrobe.apply(pending)
+    if history_deleted:
+        novelty_index.invalidate()
+    if removed:
+        _submit_cleanup(*cleanup)
+    return results
+
+
+def _single_op(op):
+    # the one-item endpoints: same rules as a batch of one
+    result = _apply_ops([op])[0]
+    if "error" in result:
+        return jsonify({"error": result["error"]}), result["status"]
+    return jsonify(result)
 
-    db.session.delete(item)
-    db.session.commit()
-    return jsonify({"ok": True})
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    ops = (request.json or {}).get('ops')
+    if not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+        return jsonify({"error": "ops must be a list of objects"}), 400
+    if len(ops) > BATCH_MAX_OPS:
+        return jsonify({"error": f"at most {BATCH_MAX_OPS} ops per batch"}), 400
+    with span("batch.apply"):
+        results = _apply_ops(ops)
+    return jsonify({"results": results})
+
+# ---------- FILE CLEANUP ----------
+_cleanup_executor = None
+_cleanup_pid = None
+_cleanup_lock = threading.Lock()
+
+
+def _cleanup_job(removed):
+    # -> (item ids, files, content hashes) to remove for deleted items; call
+    # after their rows were flushed, so the thumbnails another item still
+    # shares (same upload bytes) are kept
+    removed = list(removed)
+    paths = [it.path for it in removed]
+    # items uploaded before the shared store had one .npy file each
+    paths += [it.embedding_path for it in removed if it.embedding_path and it.embedding_path.endswith(".npy")]
+    hashes = {it.content_hash for it in removed if it.content_hash}
+    if hashes:
+        hashes -= {h for (h,) in db.session.query(ClothingItem.content_hash).filter(ClothingItem.content_hash.in_(hashes))}
+    return [it.id for it in removed], paths, hashes
+
+
+def _remove_files(item_ids, paths, hashes):
+    embedding_store.delete_many(item_ids)
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    for content_hash in hashes:
+        remove_thumbnails(content_hash)
+
+
+def _submit_cleanup(item_ids, paths, hashes):
+    # one background thread per process (created after any fork)
+    global _cleanup_executor, _cleanup_pid
+    with _cleanup_lock:
+        if _cleanup_pid != os.getpid():
+            _cleanup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cleanup")
+            _cleanup_pid = os.getpid()
+    _cleanup_executor.submit(_remove_files, item_ids, paths, hashes)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # development server (FLASK_DEBUG=1 for the debugger); for production
+    # use gunicorn -c gunicorn.conf.py
+    app.run(threaded=True)
 
 
 
@@ -0,0 +1,109 @@
+import os
+import time
+import asyncio
+import threading
+from a2wsgi import WSGIMiddleware
+from app import app, write_buffer
+import metrics
+
+# ------------------ ASGI SERVING ------------------
+#   uvicorn asgi:application             (development)
+#   gunicorn -c gunicorn.conf.py         (production, uvicorn workers)
+#
+# Every Flask route is served unchanged, through a2wsgi's WSGI adapter: the
+# event loop streams request and response bodies, so slow clients hold no
+# thread, and Flask reads the body as it arrives (MAX_CONTENT_LENGTH bounds
+# it). Each lane has its own adapter, and so its own thread pool and limit:
+#   recommend  /api/recommend, /api/matches: CPU-bound ranking
+#   upload     /api/upload: hashing and saving the file
+#   io         everything else: snapshot reads, SQLite, images
+# A burst of uploads therefore queues behind other uploads, not in front of
+# recommendations. Classification already runs in batches on the
+# classification pool's own workers (SMARTOUTFIT_CLASSIFY_WORKERS).
+
+RECOMMEND_THREADS = int(os.environ.get("SMARTOUTFIT_RECOMMEND_THREADS", min(4, os.cpu_count() or 1)))
+UPLOAD_THREADS = int(os.environ.get("SMARTOUTFIT_UPLOAD_THREADS", 2))
+IO_THREADS = int(os.environ.get("SMARTOUTFIT_IO_THREADS", 16))
+
+LANE_WAIT = metrics.histogram("smartoutfit_lane_wait_seconds", "Time requests waited for a lane thread.", "lane")
+
+
+class Lane:
+    def __init__(self, name, threads):
+        self.name = name
+        self.threads = threads
+        self.active = 0   # queued + running
+        self._adapter = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _wsgi(self, environ, start_response):
+        # runs in the lane's thread
+        queued = environ["asgi.scope"].get("smartoutfit.queued")
+        if metrics.ENABLED and queued is not None:
+            LANE_WAIT.labels(self.name).observe(time.perf_counter() - queued)
+        # a2wsgi's input stream ends with the request body, so Werkzeug may
+        # read bodies sent without Content-Length (chunked) up to the limit
+        environ["wsgi.input_terminated"] = True
+        return app(environ, start_response)
+
+    def adapter(self):
+        # one thread pool per process, created after any fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self._adapter = WSGIMiddleware(self._wsgi, workers=self.threads)
+                self._pid = os.getpid()
+            return self._adapter
+
+    async def __call__(self, scope, receive, send):
+        scope["smartoutfit.queued"] = time.perf_counter()
+        # only touched from the event loop thread
+        self.active += 1
+        try:
+            await self.adapter()(scope, receive, send)
+        finally:
+            self.active -= 1
+
+
+LANES = {
+    "recommend": Lane("recommend", RECOMMEND_THREADS),
+    "upload": Lane("upload", UPLOAD_THREADS),
+    "io": Lane("io", IO_THREADS),
+}
+
+
+def lane_of(path):
+    if path == "/api/recommend" or path.startswith("/api/matches/"):
+        return LANES["recommend"]
+    if path == "/api/upload":
+        return LANES["upload"]
+    return LANES["io"]
+
+
+def _lane_metrics():
+    return [
+        ("smartoutfit_lane_active", "gauge", "Requests queued or running per ASGI lane.",
+         [({"lane": lane.name}, lane.active) for lane in LANES.values()]),
+    ]
+
+
+metrics.register(_lane_metrics)
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # buffered history and clicks are written before the worker exits
+            await asyncio.get_running_loop().run_in_executor(None, write_buffer.flush)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    await lane_of(scope["path"])(scope, receive, send)
@@ -0,0 +1,37 @@
+# ------------------ CATEGORY NORMALIZATION ------------------
+
+CATEGORY_MAP = {
+    "shirt": "top",
+    "t-shirt": "top",
+    "blouse": "top",
+
+    "jeans": "pants",
+    "trousers": "pants",
+    "pants": "pants",
+
+    # IMPORTANT: keep shorts separate
+    "shorts": "shorts",
+
+    "frock": "dress",
+    "gown": "dress",
+    "dress": "dress",
+
+    "chudidhar": "chudidhar",
+    "saree": "saree",
+    "kurti": "kurti",
+
+    "jacket": "outer",
+    "coat": "outer",
+    "outer": "outer",
+    "sweater": "sweater",
+
+    "top": "top",
+    "skirt": "skirt"
+}
+
+# normalized categories in a fixed order, so they can be stored as small codes
+NORM_CATEGORIES = sorted(set(CATEGORY_MAP.values()))
+NORM_CODE = {c: i for i, c in enumerate(NORM_CATEGORIES)}
+
+def normalize(cat):
+    return CATEGORY_MAP.get(cat)
@@ -0,0 +1,230 @@
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from models import db, ClothingItem
+from wardrobe import wardrobe
+from metrics import span, observe_size
+
+# ------------------ BACKGROUND CLASSIFICATION ------------------
+# /api/upload stores the item as "pending" and hands it to this pool. Worker
+# threads take whatever is queued (up to CLASSIFY_BATCH items), classify and
+# embed it in one batch, and write the categories and embeddings back. A semaphore bounds the number of
+# queued + running jobs; when it is exhausted the upload is refused instead
+# of piling up work.
+#
+# Every worker process has its own pool. An item belongs to the process
+# that stamped classify_claimed_at on it: the uploading one, or, for items
+# left pending by a process that went away, the first one whose sweep claims
+# it once the claim is older than CLAIM_TTL. Each pool sweeps when it starts
+# and then every SWEEP_SECONDS.
+#
+# When a whole batch fails even one item at a time (missing weights, a torch
+# error) the batch is retried up to CLASSIFY_ATTEMPTS times; items that still
+# fail are stored as "unknown", so no upload stays pending.
+
+PENDING = "pending"
+UNKNOWN = "unknown"
+CLAIM_TTL = timedelta(seconds=int(os.environ.get("SMARTOUTFIT_CLASSIFY_CLAIM_TTL", 600)))
+
+log = logging.getLogger(__name__)
+
+
+def classify_status(category):
+    # what /api/upload_status reports for an item: "pending" while the pool
+    # has it, then "unknown" if the classifier could not tell (the user picks
+    # the category) or "done"
+    if category in (PENDING, UNKNOWN):
+        return category
+    return "done"
+
+
+CLASSIFY_WORKERS = int(os.environ.get("SMARTOUTFIT_CLASSIFY_WORKERS", 1))
+CLASSIFY_QUEUE_SIZE = int(os.environ.get("SMARTOUTFIT_CLASSIFY_QUEUE", 32))
+CLASSIFY_BATCH = int(os.environ.get("SMARTOUTFIT_CLASSIFY_BATCH", 16))
+CLASSIFY_ATTEMPTS = int(os.environ.get("SMARTOUTFIT_CLASSIFY_ATTEMPTS", 3))
+RETRY_SECONDS = float(os.environ.get("SMARTOUTFIT_CLASSIFY_RETRY_SECONDS", 1))
+SWEEP_SECONDS = float(os.environ.get("SMARTOUTFIT_CLASSIFY_SWEEP_SECONDS", 60))
+
+
+class ClassificationPool:
+    def __init__(self, app, classify_batch, embeddings=None, workers=CLASSIFY_WORKERS,
+                 maxsize=CLASSIFY_QUEUE_SIZE, batch_size=CLASSIFY_BATCH):
+        # classify_batch(paths) -> [(category, embedding) or None]
+        self.app = app
+        self.classify_batch = classify_batch
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.workers = workers
+        self.maxsize = maxsize
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        # once per process: threads do not survive fork, so a worker forked
+        # from a preloading master starts its own pool on first use
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._slots = threading.BoundedSemaphore(self.maxsize)
+            self._queue = queue.Queue()
+            self._sweep_lock = threading.Lock()
+            self._next_sweep = 0.0   # the first worker loop sweeps right away
+            self._threads = []
+            for n in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"classify-{n}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._pid = os.getpid()
+
+    def reserve(self, block=False):
+        return self._slots.acquire(blocking=block)
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, item_id, path):
+        # caller must hold a slot from reserve()
+        self._queue.put((item_id, path))
+
+    def backlog(self):
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def _claim(self, item_id):
+        # True if this process took the item: an UPDATE that only matches an
+        # unclaimed or expired claim, so concurrent resumes cannot both win
+        now = datetime.utcnow()
+        claimed = (
+            db.session.query(ClothingItem)
+            .filter(
+                ClothingItem.id == item_id,
+                ClothingItem.category == PENDING,
+                or_(ClothingItem.classify_claimed_at.is_(None), ClothingItem.classify_claimed_at < now - CLAIM_TTL),
+            )
+            .update({ClothingItem.classify_claimed_at: now}, synchronize_session=False)
+        )
+        db.session.commit()
+        return bool(claimed)
+
+    def _resume(self):
+        # claims pending items nobody holds (left by a process that went away)
+        # as long as slots are free; returns False if it ran out of slots
+        try:
+            with self.app.app_context():
+                cutoff = datetime.utcnow() - CLAIM_TTL
+                rows = (
+                    db.session.query(ClothingItem.id, ClothingItem.path)
+                    .filter(
+                        ClothingItem.category == PENDING,
+                        or_(ClothingItem.classify_claimed_at.is_(None), ClothingItem.classify_claimed_at < cutoff),
+                    )
+                    .all()
+                )
+                for item_id, path in rows:
+                    # never blocks: this runs on a worker, which frees slots
+                    if not self.reserve():
+                        return False
+                    if self._claim(item_id):
+                        self.submit(item_id, path)
+                    else:
+                        self.release()
+        except Exception:
+            log.exception("could not resume pending classifications")
+        return True
+
+    def _sweep(self):
+        # one worker per process at a time; again after the next batch when
+        # it ran out of slots, otherwise after SWEEP_SECONDS
+        if time.monotonic() < self._next_sweep or not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            done = self._resume()
+            self._next_sweep = time.monotonic() + (SWEEP_SECONDS if done else 0)
+        finally:
+            self._sweep_lock.release()
+
+    def _take(self):
+        try:
+            jobs = [self._queue.get(timeout=SWEEP_SECONDS)]
+        except queue.Empty:
+            return []
+        while len(jobs) < self.batch_size:
+            try:
+                jobs.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return jobs
+
+    def _run(self):
+        while True:
+            self._sweep()
+            jobs = self._take()
+            if not jobs:
+                continue
+            try:
+                self._classify(jobs)
+            except Exception:
+                # keep the worker alive; nothing was committed, so the items
+                # stay pending and a sweep resumes them once their claim expires
+                log.exception("classification of %d uploads failed", len(jobs))
+            finally:
+                for _ in jobs:
+                    self.release()
+                    self._queue.task_done()
+
+    def _classify_each(self, jobs):
+        # per-item results after a failed batch, False where an item fails
+        results = []
+        for item_id, path in jobs:
+            try:
+                results.append(self.classify_batch([path])[0])
+            except Exception:
+                log.exception("could not classify upload %s (%s)", item_id, path)
+                results.append(False)
+        return results
+
+    def _results(self, jobs):
+        # [(category, embedding) or None]; None is stored as "unknown"
+        for attempt in range(1, CLASSIFY_ATTEMPTS + 1):
+            try:
+                with span("classify.batch"):
+                    return self.classify_batch([path for _, path in jobs])
+            except Exception:
+                log.exception("batch of %d uploads failed, retrying one at a time", len(jobs))
+            results = self._classify_each(jobs)
+            if not all(r is False for r in results):
+                break   # only some images are at fault
+            if attempt < CLASSIFY_ATTEMPTS:
+                time.sleep(RETRY_SECONDS * attempt)
+        else:
+            log.error("classifier unavailable after %d attempts, storing %d uploads as unknown",
+                      CLASSIFY_ATTEMPTS, len(jobs))
+        return [r or None for r in results]
+
+    def _classify(self, jobs):
+        observe_size("classify.batch", len(jobs))
+        results = self._results(jobs)
+
+        embedded = [(item_id, r[1]) for (item_id, _), r in zip(jobs, results) if r]
+        if self.embeddings is not None and embedded:
+            with span("classify.embed"):
+                self.embeddings.add_many([i for i, _ in embedded], [v for _, v in embedded])
+
+        with self.app.app_context(), span("classify.commit"):
+            changed = []
+            for (item_id, _), r in zip(jobs, results):
+                item = db.session.get(ClothingItem, item_id)
+                if item is None or item.category != PENDING:
+                    continue
+                item.category = r[0] if r else UNKNOWN
+                changed.append(item)
+            if not changed:
+                return
+            pending = wardrobe.stage(changed=changed)
+            db.session.commit()
+            wardrobe.apply(pending)
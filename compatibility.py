@@ -0,0 +1,140 @@
+import os
+import threading
+import numpy as np
+from embedding_store import embedding_store
+from outfit_engine import BASE_SHAPES
+
+# ------------------ VISUAL COMPATIBILITY ------------------
+# Cosine similarity between item embeddings, computed a whole category block
+# at a time: all tops x all pants is one matrix product of unit vectors.
+#
+# For a two-piece outfit the bonus is COMPAT_WEIGHT * (cos(a, b) - mean cos
+# over the template), so it only reorders outfits within a template and does
+# not favour pairs over one-piece outfits. Items without an embedding get 0.
+
+COMPAT_WEIGHT = float(os.environ.get("SMARTOUTFIT_COMPAT_WEIGHT", 0.1))
+_CHUNK = 1024
+
+
+class Compatibility:
+    def __init__(self, view, store, weight=COMPAT_WEIGHT):
+        self.weight = weight
+        self.store_version = store.version
+        rows = store.rows(view.ids[:view.size])
+        self.has = rows >= 0
+        self.unit = np.zeros((view.size, store.dim), dtype=np.float32)
+        if self.has.any():
+            _, vectors = store.matrix()
+            v = np.asarray(vectors[rows[self.has]], dtype=np.float32)
+            norms = np.linalg.norm(v, axis=1, keepdims=True)
+            self.unit[self.has] = v / np.maximum(norms, 1e-12)
+        self._bind(view)
+
+    def _bind(self, view):
+        self.view = view
+        self._cat_block = {}
+        self._cat_sum = {}
+        self._max = {}
+        self._lock = threading.Lock()
+
+    def rebind(self, view):
+        # same rows and embeddings, different category grouping
+        other = object.__new__(Compatibility)
+        other.__dict__.update(self.__dict__)
+        other._bind(view)
+        return other
+
+    # ---------- block similarity ----------
+
+    def similarity(self, rows_a, rows_b):
+        return self.unit[rows_a] @ self.unit[rows_b].T
+
+    def _category_sum(self, cat):
+        if cat not in self._cat_sum:
+            rows = self.view.by_cat.get(cat, np.empty(0, dtype=np.intp))
+            self._cat_sum[cat] = (self.unit[rows].sum(axis=0), int(self.has[rows].sum()))
+        return self._cat_sum[cat]
+
+    def _mean(self, cat_a, cat_b):
+        (sa, na), (sb, nb) = self._category_sum(cat_a), self._category_sum(cat_b)
+        return float(sa @ sb) / (na * nb) if na and nb else 0.0
+
+    def block(self, template, slots):
+        # bonus for every combination of slots[0] x slots[1], or None for one-piece templates
+        if len(slots) != 2 or not self.weight:
+            return None
+        a, b = slots
+        mask = self.has[a][:, None] & self.has[b][None, :]
+        bonus = self.similarity(a, b) - self._mean(*template.slots)
+        return np.where(mask, bonus, 0.0) * self.weight
+
+    def upper(self, template):
+        # largest bonus any outfit of this template can get
+        if len(template.slots) != 2 or not self.weight:
+            return 0.0
+        key = template.slots
+        with self._lock:
+            if key not in self._max:
+                a, b = (self.view.by_cat.get(c, np.empty(0, dtype=np.intp)) for c in key)
+                best = 0.0
+                for start in range(0, len(a), _CHUNK):
+                    part = self.block(template, [a[start:start + _CHUNK], b])
+                    if part.size:
+                        best = max(best, float(part.max()))
+                self._max[key] = best
+            return self._max[key]
+
+    # ---------- nearest neighbours ----------
+    # Exact search over a contiguous per-category matrix: one mat-vec product
+    # and a partial sort, well under a millisecond for thousands of items.
+
+    def _category_block(self, category):
+        block = self._cat_block.get(category)
+        if block is None:
+            rows = self.view.by_cat.get(category, np.empty(0, dtype=np.intp))
+            rows = rows[self.has[rows]]
+            block = self._cat_block[category] = (rows, np.ascontiguousarray(self.unit[rows]))
+        return block
+
+    def best_matches(self, row, category, k=5):
+        if not self.has[row]:
+            return []
+        rows, unit = self._category_block(category)
+        sims = unit @ self.unit[row]
+        sims[rows == row] = -np.inf   # never match an item with itself
+        k = min(k, int(np.isfinite(sims).sum()))
+        if k == 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(int(rows[n]), float(sims[n])) for n in top]
+
+
+def partner_categories(category):
+    # categories that complete a two-piece outfit with this one
+    partners = []
+    for shape in BASE_SHAPES:
+        if len(shape) == 2 and category in shape:
+            other = shape[1] if shape[0] == category else shape[0]
+            if other not in partners:
+                partners.append(other)
+    return partners
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def compatibility(view):
+    # the unit-vector matrix only depends on which item sits in which row, so
+    # counter updates reuse it and only a changed grouping resets the caches
+    global _current
+    with _current_lock:
+        c = _current
+        if (c is None or c.view.ids is not view.ids or c.view.size != view.size
+                or c.store_version != embedding_store.version):
+            c = Compatibility(view, embedding_store)
+        elif c.view.by_cat is not view.by_cat:
+            c = c.rebind(view)
+        _current = c
+        return c
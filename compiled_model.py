@@ -0,0 +1,129 @@
+import os
+import json
+import warnings
+import numpy as np
+from encoders import GrowingLabelEncoder
+
+# ------------------ COMPILED RANKING MODEL ------------------
+# The ranking model is a logistic regression over six features, so all it
+# needs at serving time is six coefficients, an intercept and the two label
+# vocabularies. The trainers export those to ml_model.json next to the
+# pickle; the recommender loads the JSON (no sklearn import, no unpickling)
+# and scores a feature matrix as one dot product plus a sigmoid, written into
+# a buffer the caller owns.
+
+EXPORT_PATH = "ml_model.json"
+FORMAT = 1
+FEATURES = ["event", "weather", "favorite_count", "avg_times_worn", "unique_categories", "total_items"]
+PARITY_TOLERANCE = 1e-9
+
+
+class CompiledModel:
+    def __init__(self, coef, intercept, events=(), weathers=()):
+        self.coef_ = np.asarray(coef, dtype=np.float64).reshape(1, len(FEATURES))
+        self.intercept_ = np.array([float(intercept)])
+        self.w = np.ascontiguousarray(self.coef_[0])
+        self.b = float(intercept)
+        self.le_event = GrowingLabelEncoder(events)
+        self.le_weather = GrowingLabelEncoder(weathers)
+
+    @classmethod
+    def from_sklearn(cls, model, le_event, le_weather):
+        # None for models that are not a binary linear classifier over FEATURES
+        coef = getattr(model, "coef_", None)
+        if coef is None or np.shape(coef) != (1, len(FEATURES)) or not hasattr(model, "predict_proba"):
+            return None
+        return cls(coef[0], model.intercept_[0],
+                   [str(c) for c in le_event.classes_], [str(c) for c in le_weather.classes_])
+
+    # ---------- scoring ----------
+
+    def score(self, X, out=None):
+        # P(positive) for every row of X, computed in place in out
+        if out is None:
+            out = np.empty(len(X))
+        np.dot(X, self.w, out=out)
+        out += self.b
+        np.negative(out, out=out)
+        np.exp(out, out=out)
+        out += 1.0
+        np.reciprocal(out, out=out)
+        return out
+
+    def predict_proba(self, X):
+        p = self.score(np.asarray(X, dtype=np.float64))
+        return np.column_stack([1.0 - p, p])
+
+    # ---------- file format ----------
+
+    def to_dict(self):
+        return {
+            "format": FORMAT,
+            "features": FEATURES,
+            "coef": self.w.tolist(),
+            "intercept": self.b,
+            "vocabularies": {
+                "event": [str(c) for c in self.le_event.classes_],
+                "weather": [str(c) for c in self.le_weather.classes_],
+            },
+        }
+
+    def save(self, path=EXPORT_PATH):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=EXPORT_PATH):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("format") != FORMAT or data.get("features") != FEATURES:
+            raise ValueError(f"{path}: unsupported model format")
+        vocab = data["vocabularies"]
+        return cls(data["coef"], data["intercept"], vocab["event"], vocab["weather"])
+
+
+def check_parity(model, compiled, n=2000, seed=0):
+    # largest |sklearn - compiled| probability over random feature rows that
+    # cover every encoded label; raises if it exceeds PARITY_TOLERANCE
+    rng = np.random.default_rng(seed)
+    X = np.empty((n, len(FEATURES)))
+    X[:, 0] = rng.integers(0, max(1, len(compiled.le_event.classes_)), n)
+    X[:, 1] = rng.integers(0, max(1, len(compiled.le_weather.classes_)), n)
+    X[:, 2] = rng.integers(0, 4, n)
+    X[:, 3] = rng.random(n) * 20
+    X[:, 4] = rng.integers(1, 4, n)
+    X[:, 5] = rng.integers(1, 4, n)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")   # models fitted on a DataFrame warn about feature names
+        expected = model.predict_proba(X)[:, 1]
+    diff = float(np.abs(expected - compiled.score(X)).max())
+    if diff > PARITY_TOLERANCE:
+        raise ValueError(f"compiled model differs from sklearn by {diff:.3g}")
+    return diff
+
+
+def compile_checked(model, le_event, le_weather):
+    # the export for a linear model, checked against sklearn (raises on a
+    # mismatch); None for any other model
+    compiled = CompiledModel.from_sklearn(model, le_event, le_weather)
+    if compiled is not None:
+        check_parity(model, compiled)
+    return compiled
+
+
+def write_export(compiled, path=EXPORT_PATH):
+    # None removes a stale export so the recommender falls back to the pickle
+    if compiled is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    compiled.save(path)
+
+
+def export(model, le_event, le_weather, path=EXPORT_PATH):
+    # writes ml_model.json for linear models
+    compiled = compile_checked(model, le_event, le_weather)
+    write_export(compiled, path)
+    return compiled
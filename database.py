@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+# ------------------ DATABASE ------------------
+# One configuration for every SQLite connection the project opens: the app's
+# Flask-SQLAlchemy engine, the training scripts and the benchmarks.
+#
+# - WAL journal: readers never block the writer and the writer never blocks
+#   readers, so gunicorn workers can recommend while another one commits.
+#   Writers still take turns; busy_timeout makes them wait instead of
+#   failing with "database is locked".
+# - synchronous=NORMAL: safe with WAL (a power cut can lose the last
+#   commits, never corrupt the file) and avoids an fsync per commit.
+# - a larger page cache, memory-mapped reads and in-memory temp tables.
+#
+# The pragmas are set on the engines this module creates (make_engine) and on
+# Flask-SQLAlchemy's engine (app.py calls attach), not on every engine in the
+# process. Connections to a database file are pooled per process (QueuePool);
+# in-memory databases keep SQLAlchemy's own pool. Nothing may be inherited
+# across fork: app.py disposes the pool after its import-time setup.
+
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+DB_PATH = os.path.join(INSTANCE_DIR, "smartoutfit.db")
+# SMARTOUTFIT_DATABASE_URL points everything at another database (e.g. a seeded benchmark copy)
+DATABASE_URL = os.environ.get("SMARTOUTFIT_DATABASE_URL", "sqlite:///" + DB_PATH)
+
+BUSY_TIMEOUT_MS = int(os.environ.get("SMARTOUTFIT_SQLITE_BUSY_TIMEOUT_MS", 10_000))
+JOURNAL_MODE = os.environ.get("SMARTOUTFIT_SQLITE_JOURNAL_MODE", "WAL")   # DELETE on filesystems without shared memory
+POOL_SIZE = int(os.environ.get("SMARTOUTFIT_DB_POOL_SIZE", 5))
+POOL_OVERFLOW = int(os.environ.get("SMARTOUTFIT_DB_POOL_OVERFLOW", 10))
+
+PRAGMAS = {
+    "journal_mode": JOURNAL_MODE,
+    "synchronous": "NORMAL",
+    "busy_timeout": BUSY_TIMEOUT_MS,
+    "cache_size": -32_000,          # KiB, per connection
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+os.makedirs(INSTANCE_DIR, exist_ok=True)
+
+
+def apply_pragmas(conn):
+    cur = conn.cursor()
+    for name, value in PRAGMAS.items():
+        cur.execute(f"PRAGMA {name}={value}")
+    cur.close()
+
+
+def _on_connect(dbapi_conn, _):
+    if isinstance(dbapi_conn, sqlite3.Connection):
+        apply_pragmas(dbapi_conn)
+
+
+def attach(engine):
+    # applies PRAGMAS to every new connection of this engine
+    if engine.dialect.name == "sqlite" and not event.contains(engine, "connect", _on_connect):
+        event.listen(engine, "connect", _on_connect)
+    return engine
+
+
+def file_backed(url=None):
+    # False for sqlite://, sqlite:///:memory: and file:...?mode=memory: those
+    # use one connection per thread or one shared one, which pool_size etc. do
+    # not apply to, and disposing the pool drops the database
+    url = make_url(url or DATABASE_URL)
+    database = url.database or ""
+    return database not in ("", ":memory:") and url.query.get("mode") != "memory"
+
+
+def engine_options(url=None):
+    # for create_engine() and app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+    url = make_url(url or DATABASE_URL)
+    if url.get_backend_name() != "sqlite":
+        return {}
+    options = {"connect_args": {"timeout": BUSY_TIMEOUT_MS / 1000, "check_same_thread": False}}
+    if file_backed(url):
+        options.update(pool_size=POOL_SIZE, max_overflow=POOL_OVERFLOW, pool_timeout=BUSY_TIMEOUT_MS / 1000)
+    return options
+
+
+def make_engine(url=None):
+    url = url or DATABASE_URL
+    return attach(create_engine(url, **engine_options(url)))
+
+
+_engine = None
+_engine_pid = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    # the shared engine for code outside the Flask app; recreated in a
+    # forked child so it never reuses the parent's connections
+    global _engine, _engine_pid
+    with _engine_lock:
+        if _engine is None or _engine_pid != os.getpid():
+            _engine = make_engine()
+            _engine_pid = os.getpid()
+        return _engine
+
+
+@contextmanager
+def raw_connection(engine=None):
+    # a pooled sqlite3.Connection (for pandas.read_sql_query and executemany);
+    # returned to the pool afterwards
+    fairy = (engine or get_engine()).raw_connection()
+    try:
+        yield fairy.driver_connection
+    finally:
+        fairy.close()
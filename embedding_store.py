@@ -0,0 +1,191 @@
+import os
+import json
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:   # Windows: single-process dev server only
+    fcntl = None
+
+# ------------------ EMBEDDING STORE ------------------
+# All item embeddings live in one append-only float32 matrix file
+# (vectors.f32) with a parallel int64 file of item ids (ids.i64). Readers map
+# the matrix once and get zero-copy views of any row. Deleting an item
+# overwrites its id with -1 (a tombstone); compact() rewrites both files
+# without tombstones and swaps them in atomically.
+
+EMBED_DIM = 1280   # MobileNetV2 penultimate layer
+TOMBSTONE = -1
+
+
+class EmbeddingStore:
+    def __init__(self, root="embeddings", dim=EMBED_DIM):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.vectors_path = os.path.join(root, "vectors.f32")
+        self.ids_path = os.path.join(root, "ids.i64")
+        self.meta_path = os.path.join(root, "store.json")
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._row_of = {}
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        else:
+            self.dim = dim
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": dim}, f)
+
+    # ---------- locking across worker processes ----------
+
+    def _file_lock(self):
+        return _FileLock(os.path.join(self.root, ".lock"))
+
+    # ---------- reading ----------
+
+    def _current_stamp(self):
+        try:
+            v, i = os.stat(self.vectors_path), os.stat(self.ids_path)
+        except FileNotFoundError:
+            return None
+        return (v.st_ino, v.st_size, i.st_ino, i.st_size, i.st_mtime_ns)
+
+    def _refresh(self):
+        stamp = self._current_stamp()
+        if stamp == self._stamp:
+            return
+        if stamp is None:
+            n = 0
+        else:
+            # ids are written after vectors, so a row only counts once its id is on disk
+            n = min(stamp[1] // (4 * self.dim), stamp[3] // 8)
+        if n:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+            self._ids = np.fromfile(self.ids_path, dtype=np.int64, count=n)
+        else:
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            self._ids = np.empty(0, dtype=np.int64)
+        # later rows win, so re-adding an item supersedes its older vector
+        self._row_of = {int(i): r for r, i in enumerate(self._ids) if i != TOMBSTONE}
+        self._stamp = stamp
+
+    def get(self, item_id):
+        with self._lock:
+            self._refresh()
+            r = self._row_of.get(int(item_id))
+            return None if r is None else self._vectors[r]
+
+    def rows(self, item_ids):
+        # matrix row for every id, -1 where the item has no embedding
+        with self._lock:
+            self._refresh()
+            return np.array([self._row_of.get(int(i), -1) for i in item_ids], dtype=np.intp)
+
+    def matrix(self):
+        # (ids, vectors) for every row on disk; tombstoned rows have id -1
+        with self._lock:
+            self._refresh()
+            return self._ids, self._vectors
+
+    @property
+    def version(self):
+        # changes whenever rows are appended, tombstoned or compacted
+        with self._lock:
+            self._refresh()
+            return self._stamp
+
+    def __contains__(self, item_id):
+        with self._lock:
+            self._refresh()
+            return int(item_id) in self._row_of
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    # ---------- writing ----------
+
+    def add(self, item_id, vector):
+        self.add_many([item_id], np.asarray(vector)[None, :])
+
+    def add_many(self, item_ids, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(item_ids), self.dim):
+            raise ValueError(f"expected {len(item_ids)} vectors of size {self.dim}, got {vectors.shape}")
+        with self._lock, self._file_lock():
+            n = self._rows_on_disk()
+            old = [self._row_of.get(int(i)) for i in item_ids]
+            with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+                f.seek(n * 4 * self.dim)
+                f.write(vectors.tobytes())
+                f.truncate()
+            with open(self.ids_path, "r+b" if os.path.exists(self.ids_path) else "wb") as f:
+                f.seek(n * 8)
+                f.write(np.asarray(item_ids, dtype=np.int64).tobytes())
+                f.truncate()
+            self._tombstone_rows([r for r in old if r is not None])
+
+    def delete(self, item_id):
+        self.delete_many([item_id])
+
+    def delete_many(self, item_ids):
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._tombstone_rows([r for r in (self._row_of.get(int(i)) for i in item_ids) if r is not None])
+
+    def compact(self):
+        with self._lock, self._file_lock():
+            self._stamp = None
+            self._refresh()
+            live = np.flatnonzero(self._ids != TOMBSTONE)
+            tmp_vectors, tmp_ids = self.vectors_path + ".tmp", self.ids_path + ".tmp"
+            with open(tmp_vectors, "wb") as f:
+                for start in range(0, len(live), 4096):
+                    f.write(np.ascontiguousarray(self._vectors[live[start:start + 4096]]).tobytes())
+            self._ids[live].tofile(tmp_ids)
+            removed = len(self._ids) - len(live)
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_ids, self.ids_path)
+            self._stamp = None
+            return removed
+
+    # ---------- helpers (caller holds both locks) ----------
+
+    def _rows_on_disk(self):
+        self._refresh()
+        return len(self._ids)
+
+    def _tombstone_rows(self, rows):
+        if not rows:
+            return
+        with open(self.ids_path, "r+b") as f:
+            for r in sorted(rows):
+                f.seek(r * 8)
+                f.write(np.int64(TOMBSTONE).tobytes())
+        self._stamp = None
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, "a")
+        if fcntl:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+
+
+embedding_store = EmbeddingStore()
@@ -0,0 +1,38 @@
+import numpy as np
+
+# ------------------ GROWING LABEL ENCODER ------------------
+# Drop-in for sklearn's LabelEncoder (classes_, transform, inverse_transform)
+# whose codes never change: labels seen later are appended, so a model that
+# was trained on the old codes still reads them the same way.
+
+
+class GrowingLabelEncoder:
+    def __init__(self, classes=()):
+        self.classes_ = np.array(list(classes), dtype=object)
+        self._codes = {c: n for n, c in enumerate(self.classes_)}
+
+    @classmethod
+    def from_encoder(cls, encoder):
+        # a fitted LabelEncoder keeps its codes: they are indices into classes_
+        if isinstance(encoder, cls):
+            return encoder
+        return cls(getattr(encoder, "classes_", ()))
+
+    def partial_fit(self, values):
+        for v in values:
+            if v not in self._codes:
+                self._codes[v] = len(self._codes)
+        self.classes_ = np.array(list(self._codes), dtype=object)
+        return self
+
+    def fit_transform(self, values):
+        return self.partial_fit(values).transform(values)
+
+    def transform(self, values):
+        try:
+            return np.array([self._codes[v] for v in values], dtype=np.int64)
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: {e.args[0]!r}") from None
+
+    def inverse_transform(self, codes):
+        return self.classes_[np.asarray(codes, dtype=np.int64)]
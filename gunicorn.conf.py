@@ -0,0 +1,35 @@
+# gunicorn.conf.py
+# Production server:
+#   gunicorn -c gunicorn.conf.py
+#
+# SMARTOUTFIT_SERVER=asgi (the default when uvicorn is installed) serves
+# asgi:application on uvicorn workers, with per-lane executors for
+# recommendations, uploads and everything else (see asgi.py).
+# SMARTOUTFIT_SERVER=wsgi serves app:app on threaded sync workers instead.
+#
+# One worker process per core: each has its own GIL, wardrobe snapshot and
+# models, so CPU-bound ranking scales with processes and threads only cover
+# waiting on SQLite, files and clients.
+import os
+import importlib.util
+
+SERVER = os.environ.get("SMARTOUTFIT_SERVER") or ("asgi" if importlib.util.find_spec("uvicorn") else "wsgi")
+
+bind = os.environ.get("SMARTOUTFIT_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("SMARTOUTFIT_WORKERS", os.cpu_count() or 1))
+
+if SERVER == "asgi":
+    wsgi_app = "asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "app:app"
+    worker_class = "gthread"
+    threads = int(os.environ.get("SMARTOUTFIT_THREADS", 8))
+
+# app.py closes its setup connections before workers fork; set
+# SMARTOUTFIT_PRELOAD=1 to load the models once in the master as well
+preload_app = True
+timeout = 60
+graceful_timeout = 30   # time to flush the write buffer on shutdown
+keepalive = 5
+accesslog = "-"
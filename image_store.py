@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from metrics import Counter
+
+# ------------------ UPLOADED IMAGES ------------------
+# Uploads are hashed (SHA-256) while they stream to disk, so a re-upload of
+# the same bytes is recognised without a second read. Thumbnails are keyed by
+# that hash: THUMB_SIZES (longest side, px) in WebP and JPEG, made in the
+# background after an upload and on first request for older items.
+
+THUMB_DIR = "thumbnails"
+THUMB_SIZES = (128, 256, 512)
+THUMB_QUALITY = 80
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+_CHUNK = 1 << 16
+
+os.makedirs(THUMB_DIR, exist_ok=True)
+
+
+def save_upload(stream, path):
+    # copy stream to path, returning the hex digest of what was written
+    digest = hashlib.sha256()
+    with open(path, "wb") as out:
+        for chunk in iter(lambda: stream.read(_CHUNK), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# ---------- thumbnails ----------
+
+def pick_size(requested):
+    # smallest stored size that is at least the requested one
+    for size in THUMB_SIZES:
+        if size >= requested:
+            return size
+    return THUMB_SIZES[-1]
+
+
+def thumb_path(content_hash, size, fmt):
+    return os.path.join(THUMB_DIR, f"{content_hash}_{size}.{fmt}")
+
+
+def make_thumbnails(src, content_hash):
+    # every size and format from one decode, largest first so each size is
+    # downscaled from the previous one; files already on disk are kept
+    todo = [(s, f) for s in THUMB_SIZES for f in FORMATS if not os.path.exists(thumb_path(content_hash, s, f))]
+    if not todo:
+        return
+    with Image.open(src) as img:
+        img.draft("RGB", (THUMB_SIZES[-1], THUMB_SIZES[-1]))   # JPEG: decode at reduced scale
+        img = img.convert("RGB")
+        for size in sorted(THUMB_SIZES, reverse=True):
+            img.thumbnail((size, size))
+            for fmt, (pil_format, _) in FORMATS.items():
+                if (size, fmt) not in todo:
+                    continue
+                dest = thumb_path(content_hash, size, fmt)
+                tmp = f"{dest}.{threading.get_ident()}.tmp"
+                img.save(tmp, pil_format, quality=THUMB_QUALITY)
+                os.replace(tmp, dest)
+
+
+thumbnail_hits = Counter()
+thumbnail_misses = Counter()
+
+
+def thumbnail(src, content_hash, size, fmt):
+    path = thumb_path(content_hash, size, fmt)
+    if os.path.exists(path):
+        thumbnail_hits.inc()
+    else:
+        thumbnail_misses.inc()
+        make_thumbnails(src, content_hash)
+    return path
+
+
+def remove_thumbnails(content_hash):
+    for size in THUMB_SIZES:
+        for fmt in FORMATS:
+            try:
+                os.remove(thumb_path(content_hash, size, fmt))
+            except FileNotFoundError:
+                pass
+
+# ---------- background generation ----------
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def pregenerate(src, content_hash):
+    # one background thread per process (created after any fork)
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+            _executor_pid = os.getpid()
+    _executor.submit(_pregenerate, src, content_hash)
+
+
+def _pregenerate(src, content_hash):
+    try:
+        make_thumbnails(src, content_hash)
+    except Exception:
+        pass   # served from the original until a request retries
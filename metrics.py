@@ -0,0 +1,215 @@
+import os
+import time
+import bisect
+import threading
+
+# ------------------ METRICS ------------------
+# Fixed-bucket histograms and counters kept in process memory and rendered in
+# the Prometheus text format by /metrics. A span is two perf_counter() calls,
+# a bisect and a locked increment (a few microseconds), cheap enough to leave
+# on; SMARTOUTFIT_METRICS=0 turns spans into no-ops.
+#
+# Each worker process keeps its own numbers, so with several workers a scrape
+# sees the one that answered it; sum them with a per-instance label or run
+# one worker per scrape target.
+#
+# Quantiles (p50/p95/p99) are estimated from the buckets the same way
+# Prometheus' histogram_quantile() does and exported alongside each histogram
+# for dashboards that read them directly.
+
+ENABLED = os.environ.get("SMARTOUTFIT_METRICS", "1") != "0"
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)   # last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self):
+        # (cumulative counts per bucket incl. +Inf, sum)
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        for i in range(1, len(counts)):
+            counts[i] += counts[i - 1]
+        return counts, total
+
+    def quantile(self, q, counts=None):
+        # linear interpolation inside the bucket holding the q-th observation;
+        # None without observations
+        counts = counts or self.snapshot()[0]
+        if not counts[-1]:
+            return None
+        rank = q * counts[-1]
+        i = bisect.bisect_left(counts, rank)
+        if i == len(self.buckets):
+            return self.buckets[-1]
+        lower = self.buckets[i - 1] if i else 0.0
+        below = counts[i - 1] if i else 0
+        in_bucket = counts[i] - below
+        return lower + (self.buckets[i] - lower) * ((rank - below) / in_bucket if in_bucket else 0.0)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Family:
+    # one metric name, one child per label value
+    def __init__(self, name, help, kind, label, buckets=None):
+        self.name, self.help, self.kind, self.label = name, help, kind, label
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value):
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.get(value)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+                    self._children[value] = child
+        return child
+
+    def children(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+
+_families = []
+_collectors = []
+
+
+def histogram(name, help, label, buckets=LATENCY_BUCKETS):
+    family = Family(name, help, "histogram", label, buckets)
+    _families.append(family)
+    return family
+
+
+def counter(name, help, label):
+    # name should end in _total
+    family = Family(name, help, "counter", label)
+    _families.append(family)
+    return family
+
+
+def register(collect):
+    # collect() -> [(name, kind, help, [(labels dict, value)])], called per scrape
+    _collectors.append(collect)
+
+# ---------- spans ----------
+
+SPANS = histogram("smartoutfit_span_seconds", "Time spent in each stage of a request.", "span")
+SIZES = histogram("smartoutfit_span_items", "Items handled by a stage (candidates, batch sizes).", "span",
+                  buckets=COUNT_BUCKETS)
+
+
+class span:
+    # with span("recommend.score"): ...
+    __slots__ = ("_hist", "_start")
+
+    def __init__(self, name):
+        self._hist = SPANS.labels(name) if ENABLED else None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self._hist is not None:
+            self._hist.observe(time.perf_counter() - self._start)
+
+
+class Stopwatch:
+    # sums many short sections (e.g. one per candidate) and records the
+    # total as a single observation
+    __slots__ = ("name", "total", "_start")
+
+    def __init__(self, name):
+        self.name, self.total = name, 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total += time.perf_counter() - self._start
+
+    def record(self):
+        if ENABLED:
+            SPANS.labels(self.name).observe(self.total)
+
+
+def observe_size(name, n):
+    if ENABLED:
+        SIZES.labels(name).observe(n)
+
+# ---------- exposition ----------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + "}"
+
+
+def _number(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render():
+    lines = []
+    for family in _families:
+        children = family.children()
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        quantiles = []
+        for value, child in children:
+            labels = {family.label: value}
+            if family.kind == "counter":
+                lines.append(f"{family.name}{_labels(labels)} {child.value}")
+                continue
+            counts, total = child.snapshot()
+            for bound, count in zip(family.buckets + (float("inf"),), counts):
+                lines.append(f"{family.name}_bucket{_labels(dict(labels, le=_number(bound)))} {count}")
+            lines.append(f"{family.name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{family.name}_count{_labels(labels)} {counts[-1]}")
+            for q in QUANTILES:
+                estimate = child.quantile(q, counts)
+                if estimate is not None:
+                    quantiles.append((dict(labels, quantile=str(q)), estimate))
+        if quantiles:
+            name = f"{family.name}_quantile"
+            lines.append(f"# HELP {name} {family.help} Quantiles estimated from the buckets.")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{_labels(labels)} {_number(v)}" for labels, v in quantiles)
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_labels(labels)} {_number(v)}" for labels, v in samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,126 @@
+import os
+import time
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+from models import db, ClothingItem, OutfitHistory, OutfitHistoryItem, SchemaMigration
+from image_store import file_hash
+
+# ------------------ MIGRATIONS ------------------
+# db.create_all() adds missing tables but never changes existing ones or
+# their rows. Each function below runs once per database, in order, right
+# after create_all(); its name is recorded in schema_migration when it
+# commits. Columns added to an existing model are added here too.
+#
+# Every worker process imports the app, so several may boot at once. Each
+# migration runs in a BEGIN IMMEDIATE transaction, which holds SQLite's write
+# lock, and first re-checks schema_migration: the workers that waited for the
+# lock then skip what the first one applied. LOCK_WAIT bounds the wait, which
+# may be longer than busy_timeout while a backfill runs.
+
+MIGRATIONS = []
+_BATCH = 5000
+LOCK_WAIT = float(os.environ.get("SMARTOUTFIT_MIGRATION_LOCK_WAIT", 600))
+
+
+def migration(fn):
+    MIGRATIONS.append(fn)
+    return fn
+
+
+@migration
+def backfill_outfit_history_item():
+    # history written before outfit_history_item existed only has items_used
+    done = db.session.query(OutfitHistoryItem.history_id).distinct()
+    last = 0
+    while True:
+        rows = (
+            db.session.query(OutfitHistory.id, OutfitHistory.items_used, OutfitHistory.created_at)
+            .filter(OutfitHistory.id > last, OutfitHistory.id.notin_(done))
+            .order_by(OutfitHistory.id)
+            .limit(_BATCH)
+            .all()
+        )
+        if not rows:
+            return
+        batch = []
+        for history_id, items_used, created_at in rows:
+            ids = [s for s in (items_used or "").split(",") if s.strip().isdigit()]
+            batch.extend(
+                {"history_id": history_id, "position": n, "item_id": int(i),
+                 "created_at": created_at or datetime.min}
+                for n, i in enumerate(ids)
+            )
+        if batch:
+            db.session.execute(OutfitHistoryItem.__table__.insert(), batch)
+        last = rows[-1][0]
+
+def _add_column(model, column, ddl):
+    # no-op on databases created after the column was added to the model
+    table = model.__tablename__
+    if column not in {c["name"] for c in inspect(db.session.connection()).get_columns(table)}:
+        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+@migration
+def add_clothing_item_content_hash():
+    _add_column(ClothingItem, "content_hash", "VARCHAR")
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_clothing_item_content_hash ON clothing_item (content_hash)"
+    ))
+    rows = db.session.query(ClothingItem.id, ClothingItem.path).filter(ClothingItem.content_hash.is_(None)).all()
+    for item_id, path in rows:
+        if os.path.exists(path):
+            db.session.query(ClothingItem).filter(ClothingItem.id == item_id).update(
+                {ClothingItem.content_hash: file_hash(path)}, synchronize_session=False
+            )
+
+
+@migration
+def add_query_indexes():
+    # same names create_all() gives the index=True columns on new databases
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_clothing_item_category ON clothing_item (category)"))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_outfit_history_created_at ON outfit_history (created_at)"))
+
+
+@migration
+def add_clothing_item_version():
+    # existing items count as unchanged since version 0
+    _add_column(ClothingItem, "version", "INTEGER DEFAULT 0")
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_clothing_item_version ON clothing_item (version)"))
+
+
+@migration
+def add_clothing_item_classify_claim():
+    _add_column(ClothingItem, "classify_claimed_at", "DATETIME")
+
+
+def _begin_immediate():
+    # starts the session's transaction holding the write lock
+    deadline = time.monotonic() + LOCK_WAIT
+    while True:
+        try:
+            db.session.execute(text("BEGIN IMMEDIATE"))
+            return
+        except OperationalError as e:
+            db.session.rollback()
+            if "locked" not in str(e) or time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def run_migrations():
+    applied = {name for (name,) in db.session.query(SchemaMigration.name)}
+    db.session.commit()
+    for fn in MIGRATIONS:
+        if fn.__name__ in applied:
+            continue
+        _begin_immediate()
+        try:
+            if db.session.get(SchemaMigration, fn.__name__) is None:
+                fn()
+                db.session.add(SchemaMigration(name=fn.__name__))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
@@ -1,5 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -9,10 +9,19 @@ class ClothingItem(db.Model):
     filename = Column(String, unique=True, nullable=False)
     path = Column(String, nullable=False)
     embedding_path = Column(String, nullable=False)
-    category = Column(String, default="unknown")
+    category = Column(String, default="unknown", index=True)
     color = Column(String, default="unknown")
     times_worn = Column(Integer, default=0)
     favorited = Column(Boolean, default=False)
+    content_hash = Column(String, index=True)   # SHA-256 of the uploaded file
+    version = Column(Integer, default=0, index=True)   # wardrobe version of the last change
+    classify_claimed_at = Column(DateTime)   # when a worker process took it for classification
+
+
+class ItemTombstone(db.Model):
+    # deleted items, so /api/items?since= can report them
+    item_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
 
 
 class OutfitHistory(db.Model):
@@ -24,4 +33,29 @@ class OutfitHistory(db.Model):
     items_used = Column(Text, nullable=False)  # store item IDs as comma-separated string
     justification = Column(Text, nullable=False)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    items = db.relationship(
+        "OutfitHistoryItem", cascade="all, delete-orphan", order_by="OutfitHistoryItem.position"
+    )
+
+
+class OutfitHistoryItem(db.Model):
+    # one row per item of a history entry, so lookups by item or time window
+    # are index scans; created_at is copied from the entry for the same reason
+    history_id = Column(Integer, ForeignKey("outfit_history.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+
+class WardrobeState(db.Model):
+    # single row; version is bumped in the same transaction as every wardrobe write
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class SchemaMigration(db.Model):
+    # names of the data migrations in migrations.py that already ran
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,99 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db, OutfitHistoryItem
+
+# ------------------ NOVELTY INDEX ------------------
+# Maps frozenset(item ids) -> last time that exact outfit was recommended.
+# Filled once from outfit_history_item (an index range scan over the window), then kept
+# current by record() as /api/recommend writes new history rows. Other worker
+# processes write history too: refresh(), once per recommendation, loads the
+# rows above the highest history id seen so far (a primary key range scan
+# that is usually empty), the way wardrobe.view() checks the version.
+
+NOVELTY_WINDOW = timedelta(days=3)
+
+
+def _key(item_ids):
+    return frozenset(int(i) for i in item_ids)
+
+
+class NoveltyIndex:
+    def __init__(self, window=NOVELTY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._expiry = []   # heap of (created_at, key)
+        self._max_id = 0    # highest outfit_history id loaded
+        self._loaded = False
+
+    def _add(self, key, created_at):
+        if created_at <= self._last_used.get(key, datetime.min):
+            return
+        self._last_used[key] = created_at
+        heapq.heappush(self._expiry, (created_at, key))
+
+    def _expire(self, cutoff):
+        while self._expiry and self._expiry[0][0] < cutoff:
+            created_at, key = heapq.heappop(self._expiry)
+            if self._last_used.get(key) == created_at:
+                del self._last_used[key]
+
+    def _merge(self, rows):
+        outfits = {}
+        for history_id, item_id, created_at in rows:
+            outfits.setdefault(history_id, ([], created_at))[0].append(item_id)
+        for item_ids, created_at in outfits.values():
+            self._add(_key(item_ids), created_at)
+        if outfits:
+            self._max_id = max(self._max_id, max(outfits))
+
+    def _rows(self):
+        return db.session.query(OutfitHistoryItem.history_id, OutfitHistoryItem.item_id, OutfitHistoryItem.created_at)
+
+    def load(self):
+        cutoff = datetime.utcnow() - self.window
+        max_id = db.session.query(func.max(OutfitHistoryItem.history_id)).scalar() or 0
+        rows = (
+            self._rows()
+            .filter(OutfitHistoryItem.created_at >= cutoff, OutfitHistoryItem.history_id <= max_id)
+            .all()
+        )
+        with self._lock:
+            self._last_used = {}
+            self._expiry = []
+            self._max_id = max_id
+            self._merge(rows)
+            self._loaded = True
+
+    def refresh(self):
+        if not self._loaded:
+            self.load()
+            return
+        rows = self._rows().filter(OutfitHistoryItem.history_id > self._max_id).all()
+        if rows:
+            with self._lock:
+                self._merge(rows)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def record(self, item_ids, created_at=None):
+        with self._lock:
+            if self._loaded:
+                self._add(_key(item_ids), created_at or datetime.utcnow())
+
+    def is_recent(self, item_ids):
+        if not self._loaded:
+            self.load()
+        with self._lock:
+            self._expire(datetime.utcnow() - self.window)
+            return _key(item_ids) in self._last_used
+
+    def __len__(self):
+        return len(self._last_used)
+
+
+novelty_index = NoveltyIndex()
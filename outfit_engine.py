@@ -0,0 +1,190 @@
+import heapq
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from categories import NORM_CATEGORIES
+
+# ------------------ EVENT RULES ------------------
+
+def event_ok(cats, event):
+    cats = set(cats)
+
+    # CASUAL
+    if event == "casual":
+        return (
+            ("top" in cats and ("pants" in cats or "shorts" in cats)) or
+            ("kurti" in cats and "pants" in cats) or
+            (cats == {"dress"})
+        )
+
+    # FORMAL (shirt + pants only)
+    if event == "formal":
+        return (
+            ("top" in cats and "pants" in cats)
+        )
+
+    # PARTY
+    if event == "party":
+        return (
+            cats == {"dress"} or
+            ("top" in cats and "skirt" in cats)
+        )
+
+    # DATE
+    if event == "date":
+        return (
+            cats == {"dress"} or
+            ("top" in cats and ("pants" in cats or "skirt" in cats))
+        )
+
+    # TRADITIONAL (NO shorts allowed)
+    if event == "traditional":
+        return (
+            ("kurti" in cats and "pants" in cats) or
+            ("chudidhar" in cats) or
+            ("saree" in cats)
+        )
+
+    return False
+
+# ------------------ WEATHER RULES ------------------
+# A weather adds at most one layer: the first item (by id) from its layer
+# categories. Blocked categories rule out any outfit that contains them.
+
+WEATHER_LAYERS = {
+    "cold": ("sweater", "outer"),
+    "rainy": ("outer",),
+}
+
+WEATHER_BLOCKED = {
+    "windy": {"skirt"},
+}
+
+# ------------------ TEMPLATES ------------------
+# Every base outfit the wardrobe can produce, in enumeration order. Templates
+# for an (event, weather) pair are the shapes that pass event_ok and the
+# weather rules, so combinations that would be discarded are never built.
+
+BASE_SHAPES = [
+    ("dress",),
+    ("top", "pants"),
+    ("top", "shorts"),
+    ("top", "skirt"),
+    ("kurti", "pants"),
+    ("chudidhar",),
+    ("saree",),
+]
+
+Template = namedtuple("Template", ["slots", "layer"])
+
+
+@lru_cache(maxsize=None)
+def compile_templates(event, weather):
+    blocked = WEATHER_BLOCKED.get(weather, set())
+    layer = WEATHER_LAYERS.get(weather, ())
+    return tuple(
+        Template(shape, layer)
+        for shape in BASE_SHAPES
+        if event_ok(shape, event) and not blocked.intersection(shape)
+    )
+
+
+def layer_rows(view, template):
+    blocks = [view.by_cat[c] for c in template.layer if c in view.by_cat]
+    return [int(np.concatenate(blocks).min())] if blocks else []
+
+# ------------------ ENUMERATION ------------------
+
+def enumerate_outfits(view, event, weather):
+    # yields outfits (lists of wardrobe rows) lazily, so memory stays flat
+    for tpl in compile_templates(event, weather):
+        if not all(c in view.by_cat for c in tpl.slots):
+            continue
+        layer = layer_rows(view, tpl)
+        for combo in itertools.product(*(view.by_cat[c].tolist() for c in tpl.slots)):
+            yield list(combo) + layer
+
+
+Block = namedtuple("Block", ["template", "slots", "layer", "rows"])
+
+
+def enumerate_blocks(view, event, weather, max_rows=None):
+    # same outfits and order as enumerate_outfits as (n, width) row matrices:
+    # one per template, or several split along the first slot when a template
+    # has more than max_rows combinations
+    for tpl in compile_templates(event, weather):
+        if not all(c in view.by_cat for c in tpl.slots):
+            continue
+        layer = layer_rows(view, tpl)
+        slots = [view.by_cat[c] for c in tpl.slots]
+        per_first = int(np.prod([len(s) for s in slots[1:]]))
+        step = max(1, max_rows // per_first) if max_rows else len(slots[0])
+        for start in range(0, len(slots[0]), step):
+            part = [slots[0][start:start + step]] + slots[1:]
+            grids = np.meshgrid(*part, indexing="ij")
+            block = np.empty((grids[0].size, len(grids) + len(layer)), dtype=np.intp)
+            for n, grid in enumerate(grids):
+                block[:, n] = grid.ravel()
+            block[:, len(grids):] = layer
+            yield Block(tpl, part, layer, block)
+
+# ------------------ BOUNDED TOP-K SEARCH ------------------
+# Works with any score of the form squash(const + sum of per-item gains)
+# where squash is increasing, minus a non-negative penalty. The first slot is
+# walked best-gain-first and the rest of the template is scored as one block;
+# once the best possible score of the next first-slot item falls below the
+# current k-th best, nothing later in the template can enter the top-k.
+#
+# scorer must provide:
+#   const(n_items, n_categories) -> float
+#   item_gains(view, rows, n_items) -> np.ndarray
+#   squash(z) -> same shape as z
+#
+# bonus (optional) adds a pairwise term after squashing and must provide:
+#   block(template, slots) -> (len(slots[0]), combinations of the rest) or None
+#   upper(template) -> largest value block() can return for the template
+
+def search_top_k(view, event, weather, k, scorer, penalty=None, bonus=None):
+    heap = []   # min-heap of (score, negated enumeration order, rows)
+
+    for t, tpl in enumerate(compile_templates(event, weather)):
+        if not all(c in view.by_cat for c in tpl.slots):
+            continue
+        blocks = [view.by_cat[c] for c in tpl.slots]
+        layer = layer_rows(view, tpl)
+        n_items = len(tpl.slots) + len(layer)
+        n_categories = len(set(tpl.slots) | {NORM_CATEGORIES[view.norm[r]] for r in layer})
+
+        z0 = scorer.const(n_items, n_categories)
+        if layer:
+            z0 += scorer.item_gains(view, np.array(layer), n_items).sum()
+
+        first = scorer.item_gains(view, blocks[0], n_items)
+        rest = np.zeros(1)
+        for block in blocks[1:]:
+            rest = (rest[:, None] + scorer.item_gains(view, block, n_items)[None, :]).ravel()
+        rest_shape = [len(b) for b in blocks[1:]]
+        best_rest = rest.max()
+        best_bonus = bonus.upper(tpl) if bonus else 0.0
+
+        for i in np.argsort(-first, kind="stable"):
+            if len(heap) == k and scorer.squash(z0 + first[i] + best_rest) + best_bonus < heap[0][0]:
+                break
+            scores = scorer.squash(z0 + first[i] + rest)
+            extra = bonus.block(tpl, [blocks[0][i:i + 1]] + blocks[1:]) if bonus else None
+            if extra is not None:
+                scores = scores + extra.ravel()
+            cand = np.flatnonzero(scores >= heap[0][0]) if len(heap) == k else range(len(rest))
+            for j in cand:
+                rows = [int(blocks[0][i])]
+                rows += [int(b[x]) for b, x in zip(blocks[1:], np.unravel_index(j, rest_shape))]
+                rows += layer
+                score = float(scores[j]) - (penalty(rows) if penalty else 0.0)
+                entry = (score, (-t, -int(i), -int(j)), rows)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+
+    return [(score, rows) for score, _, rows in sorted(heap, key=lambda e: e[:2], reverse=True)]
@@ -1,263 +1,379 @@
-import random
+import os
+import time
+import heapq
+import logging
+import threading
+from collections import namedtuple
 import numpy as np
 import joblib
-from datetime import datetime, timedelta
-from models import ClothingItem
-import sqlite3
+from compiled_model import CompiledModel, EXPORT_PATH, FEATURES
+from cache import LRUCache
+from metrics import span, Stopwatch, observe_size
+from novelty import novelty_index
+from compatibility import compatibility
+from outfit_engine import enumerate_blocks, search_top_k
+from wardrobe import wardrobe
 
 # ------------------ LOAD ML MODEL ------------------
 
-model = joblib.load("ml_model.pkl")
-le_event = joblib.load("event_encoder.pkl")
-le_weather = joblib.load("weather_encoder.pkl")
-
-# ------------------ CATEGORY NORMALIZATION ------------------
-
-CATEGORY_MAP = {
-    "shirt": "top",
-    "t-shirt": "top",
-    "blouse": "top",
-
-    "jeans": "pants",
-    "trousers": "pants",
-    "pants": "pants",
-
-    # IMPORTANT: keep shorts separate
-    "shorts": "shorts",
-
-    "frock": "dress",
-    "gown": "dress",
-    "dress": "dress",
-
-    "chudidhar": "chudidhar",
-    "saree": "saree",
-    "kurti": "kurti",
-
-    "jacket": "outer",
-    "coat": "outer",
-    "outer": "outer",
-    "sweater": "sweater",
-
-    "top": "top",
-    "skirt": "skirt"
-}
-
-def normalize(cat):
-    return CATEGORY_MAP.get(cat)
-
-# ------------------ LOAD ITEMS ------------------
-
-def _load_items():
-    items = ClothingItem.query.all()
-    item_map = {}
-    for it in items:
-        norm = normalize(it.category)
-        if norm:
-            it._norm = norm
-            item_map[it.id] = it
-    return item_map
-
-# ------------------ EVENT RULES ------------------
-
-def event_ok(cats, event):
-    cats = set(cats)
-
-    # CASUAL
-    if event == "casual":
-        return (
-            ("top" in cats and ("pants" in cats or "shorts" in cats)) or
-            ("kurti" in cats and "pants" in cats) or
-            (cats == {"dress"})
-        )
-
-    # FORMAL (shirt + pants only)
-    if event == "formal":
-        return (
-            ("top" in cats and "pants" in cats)
-        )
-
-    # PARTY
-    if event == "party":
-        return (
-            cats == {"dress"} or
-            ("top" in cats and "skirt" in cats)
-        )
-
-    # DATE
-    if event == "date":
-        return (
-            cats == {"dress"} or
-            ("top" in cats and ("pants" in cats or "skirt" in cats))
-        )
-
-    # TRADITIONAL (NO shorts allowed)
-    if event == "traditional":
-        return (
-            ("kurti" in cats and "pants" in cats) or
-            ("chudidhar" in cats) or
-            ("saree" in cats)
-        )
-
-    return False
-
-# ------------------ WEATHER LAYERING ------------------
-
-def apply_weather_layers(base, item_map, weather):
-    layered = list(base)
-    norms = [item_map[i]._norm for i in base]
-
-    if weather == "cold":
-        for i, it in item_map.items():
-            if it._norm in ["sweater", "outer"] and i not in layered:
-                layered.append(i)
-                break
-
-    if weather == "rainy":
-        for i, it in item_map.items():
-            if it._norm == "outer" and i not in layered:
-                layered.append(i)
-                break
-
-    if weather == "windy" and "skirt" in norms:
-        return None
+# The model and its encoders are swapped as one bundle when a retrain
+# replaces the files. A request takes the current bundle once and uses it
+# throughout, so it never mixes an old model with new encoders.
+#
+# Nothing is loaded at import: the first current_model() call loads the
+# bundle (or app.preload_models() does, before workers fork). The compiled
+# export (ml_model.json) is preferred; the pickles are only read for models
+# that have none. Without a readable model every outfit scores 0.5 and the
+# ranking falls back to compatibility, novelty and enumeration order.
 
-    return layered
+MODEL_PATH = "ml_model.pkl"
+EVENT_ENCODER_PATH = "event_encoder.pkl"
+WEATHER_ENCODER_PATH = "weather_encoder.pkl"
+MODEL_CHECK_INTERVAL = float(os.environ.get("SMARTOUTFIT_MODEL_CHECK_INTERVAL", 2.0))
 
-# ------------------ GENERATE BASE OUTFITS ------------------
+log = logging.getLogger(__name__)
 
-def generate_base_outfits(item_map):
-    by_cat = {}
-    for i, it in item_map.items():
-        by_cat.setdefault(it._norm, []).append(i)
+# version identifies the model in cache keys; it changes when the model is retrained
+ModelBundle = namedtuple("ModelBundle", ["model", "le_event", "le_weather", "version"])
 
-    outfits = []
 
-    for d in by_cat.get("dress", []):
-        outfits.append([d])
+def _compiled_bundle(compiled, version):
+    return ModelBundle(compiled, compiled.le_event, compiled.le_weather, version)
 
-    for t in by_cat.get("top", []):
-        for p in by_cat.get("pants", []):
-            outfits.append([t, p])
 
-    for t in by_cat.get("top", []):
-        for s in by_cat.get("shorts", []):
-            outfits.append([t, s])
+UNTRAINED = _compiled_bundle(CompiledModel(np.zeros(len(FEATURES)), 0.0), None)
 
-    for t in by_cat.get("top", []):
-        for s in by_cat.get("skirt", []):
-            outfits.append([t, s])
 
-    for k in by_cat.get("kurti", []):
-        for p in by_cat.get("pants", []):
-            outfits.append([k, p])
-
-    for c in by_cat.get("chudidhar", []):
-        outfits.append([c])
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
-    for s in by_cat.get("saree", []):
-        outfits.append([s])
 
-    return outfits
+def _model_stamp():
+    # (export mtime, pickle mtime), or None when there is no model at all
+    stamp = (_mtime(EXPORT_PATH), _mtime(MODEL_PATH))
+    return None if stamp == (None, None) else stamp
+
+
+def _load_bundle(stamp):
+    if stamp[0] is not None:
+        return _compiled_bundle(CompiledModel.load(EXPORT_PATH), stamp)
+    return ModelBundle(
+        joblib.load(MODEL_PATH), joblib.load(EVENT_ENCODER_PATH), joblib.load(WEATHER_ENCODER_PATH), stamp
+    )
+
+
+_bundle = None
+_bundle_stamp = None
+_bundle_checked = 0.0
+_bundle_lock = threading.Lock()
+
+
+def current_model():
+    # at most one stat() per MODEL_CHECK_INTERVAL; a file that fails to load
+    # is not retried until it changes, and the loaded bundle keeps serving
+    global _bundle, _bundle_stamp, _bundle_checked
+    bundle = _bundle
+    if bundle is not None and time.monotonic() - _bundle_checked < MODEL_CHECK_INTERVAL:
+        return bundle
+    with _bundle_lock:
+        if _bundle is None or time.monotonic() - _bundle_checked >= MODEL_CHECK_INTERVAL:
+            stamp = _model_stamp()
+            if _bundle is None or stamp != _bundle_stamp:
+                _bundle_stamp = stamp
+                loaded = None
+                if stamp is not None:
+                    try:
+                        loaded = _load_bundle(stamp)
+                    except Exception:
+                        log.exception("could not load ranking model from %s", MODEL_PATH)
+                _bundle = loaded or _bundle or UNTRAINED
+            _bundle_checked = time.monotonic()
+        return _bundle
 
 # ------------------ NOVELTY CHECK ------------------
 
-def recently_used(item_ids):
-    conn = sqlite3.connect("instance/smartoutfit.db")
-    cursor = conn.cursor()
-
-    cutoff = datetime.now() - timedelta(days=3)
-
-    cursor.execute("SELECT items_used, created_at FROM outfit_history")
-    rows = cursor.fetchall()
-    conn.close()
+NOVELTY_PENALTY = 0.15
+
+def recently_used(item_ids):
+    return novelty_index.is_recent(item_ids)
 
-    for items_used, created_at in rows:
-        if not created_at:
-            continue
-        if datetime.fromisoformat(created_at) >= cutoff:
-            past_ids = list(map(int, items_used.split(",")))
-            if set(past_ids) == set(item_ids):
-                return True
-    return False
-
-# ------------------ MAIN RECOMMENDER ------------------
 
-def recommend_outfits(event="casual", weather="clear", k=3):
-    item_map = _load_items()
-    if not item_map:
-        return []
+def _novelty_penalty(view, watch):
+    # called once per examined candidate; the time is summed in watch
+    with watch:
+        novelty_index.refresh()
+
+    def penalty(rows):
+        with watch:
+            return NOVELTY_PENALTY if recently_used(view.ids[rows]) else 0.0
+    return penalty
+
+# ------------------ BATCH SCORING ------------------
+# Outfits are scored a block at a time. The feature matrix is a per-thread
+# buffer reused across blocks and requests, and a compiled model writes its
+# scores straight into the caller's output slice.
+
+SCORE_CHUNK = 4096
+
+_scratch = threading.local()
+
+
+def _features_buffer(n):
+    buf = getattr(_scratch, "features", None)
+    if buf is None or len(buf) < n:
+        buf = _scratch.features = np.empty((max(n, SCORE_CHUNK), len(FEATURES)))
+    return buf[:n]
+
+
+def _encode(encoder, value):
+    try:
+        return encoder.transform([value])[0]
+    except Exception:
+        return 0
+
+
+def _feature_matrix(m, rows, view, event, weather, out=None):
+    # rows is an (n, width) block with an item in every slot; every feature
+    # is a single vectorized reduction over axis 1
+    width = rows.shape[1]
+    X = np.empty((len(rows), len(FEATURES))) if out is None else out
+    X[:, 0] = _encode(m.le_event, event)
+    X[:, 1] = _encode(m.le_weather, weather)
+    np.sum(view.favorited[rows], axis=1, out=X[:, 2])
+    np.sum(view.times_worn[rows], axis=1, out=X[:, 3])
+    X[:, 3] /= width
+
+    codes = view.norm[rows]
+    codes.sort(axis=1)
+    np.sum(codes[:, 1:] != codes[:, :-1], axis=1, out=X[:, 4])
+    X[:, 4] += 1
+    X[:, 5] = width
+    return X
+
+
+def score_block(m, block, view, event, weather, out=None):
+    X = _feature_matrix(m, block, view, event, weather, out=_features_buffer(len(block)))
+    if isinstance(m.model, CompiledModel):
+        return m.model.score(X, out)
+    scores = m.model.predict_proba(X)[:, 1]
+    if out is None:
+        return scores
+    out[:] = scores
+    return out
+
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        # argpartition finds the k-th best score; ties at that boundary go to
+        # the earliest candidates so the result does not depend on the partition
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > kth)
+        idx = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+    else:
+        idx = np.arange(len(scores))
+    # stable order inside the top-k: best score first, earlier candidate on ties
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+# ------------------ LINEAR SCORER ------------------
+# A logistic regression score splits into a per-outfit constant plus one
+# additive gain per item, which is what outfit_engine.search_top_k needs to
+# bound scores and stop early.
+
+
+class LinearScorer:
+    def __init__(self, coef, intercept, event_encoded, weather_encoded):
+        self.w = np.asarray(coef, dtype=np.float64)
+        self.b = float(intercept) + self.w[0] * event_encoded + self.w[1] * weather_encoded
+
+    def const(self, n_items, n_categories):
+        return self.b + self.w[4] * n_categories + self.w[5] * n_items
+
+    def item_gains(self, view, rows, n_items):
+        return self.w[2] * view.favorited[rows] + self.w[3] * view.times_worn[rows] / n_items
+
+    def squash(self, z):
+        return 1.0 / (1.0 + np.exp(-z))
+
+
+def linear_scorer(m, event, weather):
+    coef = getattr(m.model, "coef_", None)
+    if coef is None or coef.shape != (1, len(FEATURES)):
+        return None
+    return LinearScorer(coef[0], m.model.intercept_[0], _encode(m.le_event, event), _encode(m.le_weather, weather))
 
-    bases = generate_base_outfits(item_map)
-    seen = set()
-    scored = []
+# ------------------ RANKING CACHE ------------------
+# Full ranking of every candidate for one (event, weather) on one wardrobe
+# version, before the novelty penalty. The penalty changes with every
+# recommendation, so it is applied when the ranking is served.
 
-    for base in bases:
-        cats = [item_map[i]._norm for i in base]
+RANK_CACHE_SIZE = int(os.environ.get("SMARTOUTFIT_RANK_CACHE_SIZE", 32))
 
-        if not event_ok(cats, event):
-            continue
+ranking_cache = LRUCache(RANK_CACHE_SIZE)
+_cached_versions = None
 
-        final = apply_weather_layers(base, item_map, weather)
-        if not final:
-            continue
 
-        key = tuple(sorted(final))
-        if key in seen:
-            continue
-        seen.add(key)
 
-        items = [item_map[i] for i in final]
+class Ranking:
+    def __init__(self, rows, lengths, scores, order):
+        self.rows = rows          # (n, width) wardrobe rows, padded
+        self.lengths = lengths    # items per outfit
+        self.scores = scores      # descending
+        self.order = order        # enumeration index, breaks ties like the other paths
 
-        # -------- Feature Engineering --------
-        favorite_count = sum(int(it.favorited) for it in items)
-        avg_times_worn = sum(it.times_worn for it in items) / len(items)
-        unique_categories = len(set(it._norm for it in items))
-        total_items = len(items)
+    def __len__(self):
+        return len(self.scores)
 
-        try:
-            event_encoded = le_event.transform([event])[0]
-        except:
-            event_encoded = 0
+    def outfit(self, p):
+        return self.rows[p, :self.lengths[p]].tolist()
 
-        try:
-            weather_encoded = le_weather.transform([weather])[0]
-        except:
-            weather_encoded = 0
+    def top_k(self, k, penalty=None):
+        # penalties only lower scores, so the scan stops once the next base
+        # score cannot beat the current k-th best
+        heap = []
+        for p in range(len(self.scores)):
+            base = self.scores[p]
+            if len(heap) == k and base < heap[0][0]:
+                break
+            rows = self.outfit(p)
+            entry = (float(base) - (penalty(rows) if penalty else 0.0), -int(self.order[p]), rows)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+        return [(score, rows) for score, _, rows in sorted(heap, key=lambda e: e[:2], reverse=True)]
+
+
+def _block_scores(m, block, view, event, weather, compat, out=None):
+    scores = score_block(m, block.rows, view, event, weather, out)
+    extra = compat.block(block.template, block.slots)
+    if extra is not None:
+        scores += extra.ravel()
+    return scores
+
+
+def rank_candidates(m, view, event, weather, compat):
+    with span("recommend.candidates"):
+        blocks = list(enumerate_blocks(view, event, weather, max_rows=SCORE_CHUNK))
+    observe_size("recommend.candidates", sum(len(b.rows) for b in blocks))
+    if not blocks:
+        empty = np.empty(0, dtype=np.intp)
+        return Ranking(empty.reshape(0, 1), empty, np.empty(0), empty)
+
+    width = max(b.rows.shape[1] for b in blocks)
+    rows = np.zeros((sum(len(b.rows) for b in blocks), width), dtype=np.intp)
+    lengths = np.empty(len(rows), dtype=np.intp)
+    scores = np.empty(len(rows))
+    start = 0
+    with span("recommend.score"):
+        for block in blocks:
+            end = start + len(block.rows)
+            rows[start:end, :block.rows.shape[1]] = block.rows
+            lengths[start:end] = block.rows.shape[1]
+            _block_scores(m, block, view, event, weather, compat, out=scores[start:end])
+            start = end
+
+    order = np.lexsort((np.arange(len(scores)), -scores))
+    return Ranking(rows[order], lengths[order], scores[order], order)
+
+
+def cached_ranking(m, view, event, weather, compat):
+    global _cached_versions
+    versions = (view.version, m.version, compat.store_version)
+    if versions != _cached_versions:
+        # every older entry is unreachable now; drop them instead of waiting for eviction
+        ranking_cache.clear()
+        _cached_versions = versions
+
+    key = (event, weather) + versions
+    ranking = ranking_cache.get(key)
+    if ranking is None:
+        ranking = rank_candidates(m, view, event, weather, compat)
+        ranking_cache.put(key, ranking)
+    return ranking
 
-        features = np.array([[
-            event_encoded,
-            weather_encoded,
-            favorite_count,
-            avg_times_worn,
-            unique_categories,
-            total_items
-        ]])
+# ------------------ MAIN RECOMMENDER ------------------
 
-        score = float(model.predict_proba(features)[0][1])
 
-        # -------- Novelty Penalty --------
-        if recently_used(final):
-            score -= 0.15
+def _timed_blocks(blocks, watch):
+    # times producing each block (template filter and enumeration) in watch,
+    # not what the caller does with it
+    blocks = iter(blocks)
+    while True:
+        with watch:
+            block = next(blocks, None)
+        if block is None:
+            return
+        yield block
+
+
+def _rank_batched(m, view, event, weather, k, compat, penalty):
+    # exhaustive path for models without a linear form: score the enumeration
+    # in blocks of at most SCORE_CHUNK outfits and keep a running top-k
+    best, best_scores = np.empty((0, 1), dtype=np.intp), np.empty(0)
+    best_lengths = np.empty(0, dtype=np.intp)
+    candidates = Stopwatch("recommend.candidates")
+    n = 0
+    for block in _timed_blocks(enumerate_blocks(view, event, weather, max_rows=SCORE_CHUNK), candidates):
+        n += len(block.rows)
+        scores = _block_scores(m, block, view, event, weather, compat)
+        scores -= np.fromiter((penalty(r) for r in block.rows), dtype=np.float64, count=len(scores))
+        width = max(best.shape[1], block.rows.shape[1])
+        merged = np.zeros((len(best) + len(block.rows), width), dtype=np.intp)
+        merged[:len(best), :best.shape[1]] = best
+        merged[len(best):, :block.rows.shape[1]] = block.rows
+        merged_lengths = np.concatenate([best_lengths, np.full(len(block.rows), block.rows.shape[1])])
+        merged_scores = np.concatenate([best_scores, scores])
+        idx = top_k(merged_scores, k)
+        best, best_lengths, best_scores = merged[idx], merged_lengths[idx], merged_scores[idx]
+    candidates.record()
+    observe_size("recommend.candidates", n)
+    return [(float(s), row[:n].tolist()) for s, row, n in zip(best_scores, best, best_lengths)]
+
+
+def outfit_items(view, rows):
+    return [{
+        "id": int(view.ids[r]),
+        "category": view.category[r],
+        "url": f"/image/{int(view.ids[r])}",
+        "times_worn": int(view.times_worn[r]),
+        "favorited": bool(view.favorited[r])
+    } for r in rows]
 
-        scored.append((score, final))
 
-    if not scored:
+def recommend_outfits(event="casual", weather="clear", k=3):
+    with span("recommend.view"):
+        view = wardrobe.view()
+    if not view.by_cat:
         return []
 
-    scored.sort(reverse=True, key=lambda x: x[0])
-    top = scored[:k]
-
-    results = []
-    for score, o in top:
-        results.append({
-            "items": [{
-                "id": item_map[i].id,
-                "category": item_map[i].category,
-                "url": f"/image/{item_map[i].id}",
-                "times_worn": item_map[i].times_worn,
-                "favorited": bool(item_map[i].favorited)
-            } for i in o],
-            "justification": f"AI-ranked recommendation (score: {round(score, 2)})"
-        })
-
-    return results
\ No newline at end of file
+    with span("recommend.model"):
+        m = current_model()
+    novelty = Stopwatch("recommend.novelty")
+    penalty = _novelty_penalty(view, novelty)
+    with span("recommend.compatibility"):
+        compat = compatibility(view)
+    if ranking_cache.maxsize > 0:
+        with span("recommend.rank"):
+            ranking = cached_ranking(m, view, event, weather, compat)
+        with span("recommend.top_k"):
+            top = ranking.top_k(k, penalty)
+    else:
+        scorer = linear_scorer(m, event, weather)
+        if scorer is not None:
+            with span("recommend.search"):
+                top = search_top_k(view, event, weather, k, scorer, penalty=penalty, bonus=compat)
+        else:
+            with span("recommend.rank_batched"):
+                top = _rank_batched(m, view, event, weather, k, compat, penalty)
+    novelty.record()
+
+    return [{
+        "items": outfit_items(view, rows),
+        "justification": f"AI-ranked recommendation (score: {round(score, 2)})"
+    } for score, rows in top]
@@ -0,0 +1,68 @@
+# scripts/bench_classifier.py
+# Images per second through predict_categories at several batch sizes.
+#   python -m scripts.bench_classifier [image_dir] [--n 64]
+# Without an image directory, synthetic JPEGs are generated. Without a trained
+# classifier, an untrained MobileNetV2 with the same head shape is used.
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+import torch
+from torch import nn
+from torchvision import models
+from PIL import Image
+import numpy as np
+from scripts import classify_helper as ch
+
+BATCH_SIZES = [1, 8, 32]
+
+def _ensure_model():
+    try:
+        ch.load_classifier()
+    except (FileNotFoundError, RuntimeError):
+        backbone = models.mobilenet_v2(weights=None)
+        backbone.classifier = nn.Sequential(nn.Dropout(0.2), nn.Linear(backbone.last_channel, 4))
+        ch._model = ch.EagerBackend(backbone.to(ch.device).eval())
+        ch._classes = ["a", "b", "c", "d"]
+        print("No trained classifier found, using an untrained MobileNetV2")
+
+def _synthetic_images(n, out_dir):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        p = Path(out_dir) / f"img_{i}.jpg"
+        Image.fromarray(rng.integers(0, 255, (480, 360, 3), dtype=np.uint8)).save(p, "JPEG")
+        paths.append(str(p))
+    return paths
+
+def bench(paths, batch_size):
+    ch.predict_categories(paths[:batch_size])   # warm-up
+    start = time.perf_counter()
+    for i in range(0, len(paths), batch_size):
+        ch.predict_categories(paths[i:i + batch_size])
+    return len(paths) / (time.perf_counter() - start)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("image_dir", nargs="?")
+    ap.add_argument("--n", type=int, default=64)
+    args = ap.parse_args()
+
+    _ensure_model()
+    print(f"backend={ch._model.name} device={ch.device} torch_threads={torch.get_num_threads()} decode_threads={ch.DECODE_THREADS}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.image_dir:
+            paths = sorted(str(p) for p in Path(args.image_dir).rglob("*") if p.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp"})
+            paths = paths[:args.n]
+        else:
+            paths = _synthetic_images(args.n, tmp)
+        if not paths:
+            sys.exit("No images found")
+
+        for bs in BATCH_SIZES:
+            print(f"batch={bs:>3}  {bench(paths, bs):8.1f} images/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# scripts/bench_startup.py
+# Where `import app` spends its time, from python -X importtime, grouped by
+# top-level package; then wall time with lazy loading and with preloading.
+#   python -m scripts.bench_startup [--top 15] [--runs 3]
+import os
+import sys
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def _run(code, env=None, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=dict(os.environ, **(env or {})),
+                          capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, proc.stderr
+
+def import_breakdown(code="import app"):
+    # self time per top-level package, in seconds
+    _, err = _run(code, importtime=True)
+    totals = defaultdict(float)
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return sorted(totals.items(), key=lambda kv: -kv[1])
+
+def wall(code, env=None, runs=3):
+    return min(_run(code, env)[0] for _ in range(runs))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    breakdown = import_breakdown()
+    total = sum(t for _, t in breakdown)
+    print(f"import app: {total:.3f}s of module execution")
+    for name, t in breakdown[:args.top]:
+        print(f"  {name:<24} {t:7.3f}s  {100 * t / total:5.1f}%")
+
+    lazy = wall("import app", runs=args.runs)
+    preload = wall("import app", {"SMARTOUTFIT_PRELOAD": "1"}, runs=args.runs)
+    first = wall("import app, recommender; recommender.current_model()", runs=args.runs)
+    print(f"process start + import app (lazy)      {lazy:7.3f}s")
+    print(f"process start + import app (preload)   {preload:7.3f}s")
+    print(f"lazy + first ranking-model load        {first:7.3f}s")
+    print("torch loaded by `import app`:", "torch" in dict(breakdown))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# scripts/bench_train.py
+# Training-set build time on a synthetic history: the old per-row loop
+# against train_model.build_training_set.
+#   python -m scripts.bench_train [--history 5000] [--items 500] [--skip-legacy]
+import time
+import sqlite3
+import argparse
+import tempfile
+import os
+import numpy as np
+import pandas as pd
+import train_model
+
+CATEGORIES = ["top", "shirt", "pants", "jeans", "shorts", "skirt", "dress", "kurti", "sweater", "outer"]
+EVENTS = ["casual", "formal", "party", "date", "traditional"]
+WEATHERS = ["clear", "cold", "rainy", "windy", "hot"]
+
+def _synthetic_db(path, n_history, n_items, seed=0):
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE clothing_item (id INTEGER PRIMARY KEY, category TEXT, favorited BOOLEAN, times_worn INTEGER);
+        CREATE TABLE outfit_history (id INTEGER PRIMARY KEY, event TEXT, weather TEXT, items_used TEXT);
+        CREATE TABLE outfit_history_item (history_id INTEGER, position INTEGER, item_id INTEGER,
+                                          PRIMARY KEY (history_id, position));
+    """)
+    conn.executemany("INSERT INTO clothing_item VALUES (?, ?, ?, ?)", [
+        (i, CATEGORIES[rng.integers(len(CATEGORIES))], bool(rng.random() < 0.2), int(rng.integers(0, 6)))
+        for i in range(1, n_items + 1)
+    ])
+    history, pairs = [], []
+    for h in range(1, n_history + 1):
+        # ids past n_items stand for deleted items
+        ids = rng.choice(int(n_items * 1.05), size=rng.integers(1, 4), replace=False) + 1
+        history.append((h, EVENTS[rng.integers(len(EVENTS))], WEATHERS[rng.integers(len(WEATHERS))],
+                        ",".join(map(str, ids))))
+        pairs.extend((h, n, int(i)) for n, i in enumerate(ids))
+    conn.executemany("INSERT INTO outfit_history VALUES (?, ?, ?, ?)", history)
+    conn.executemany("INSERT INTO outfit_history_item VALUES (?, ?, ?)", pairs)
+    conn.commit()
+    return conn
+
+def legacy_build(conn):
+    # the original train_model.py loop: one isin filter per history row
+    history = pd.read_sql_query("SELECT * FROM outfit_history", conn)
+    clothing = pd.read_sql_query("SELECT * FROM clothing_item", conn)
+    rows = []
+    for _, row in history.iterrows():
+        item_ids = list(map(int, row["items_used"].split(",")))
+        items = clothing[clothing["id"].isin(item_ids)]
+        if items.empty:
+            continue
+        avg_times_worn = items["times_worn"].mean()
+        rows.append({
+            "event": row["event"],
+            "weather": row["weather"],
+            "favorite_count": items["favorited"].sum(),
+            "avg_times_worn": avg_times_worn,
+            "unique_categories": items["category"].nunique(),
+            "total_items": len(items),
+            "target": 1 if avg_times_worn >= 1 else 0
+        })
+    return pd.DataFrame(rows)
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--history", type=int, default=5000)
+    ap.add_argument("--items", type=int, default=500)
+    ap.add_argument("--chunk", type=int, default=train_model.CHUNK_ROWS)
+    ap.add_argument("--skip-legacy", action="store_true")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = _synthetic_db(os.path.join(tmp, "bench.db"), args.history, args.items)
+        new, t_new = _timed(train_model.build_training_set, conn, args.chunk)
+        print(f"history={args.history} items={args.items}")
+        print(f"vectorized  {t_new:8.3f}s  {len(new)} outfits  {args.history / t_new:10.0f} rows/s")
+        if not args.skip_legacy:
+            old, t_old = _timed(legacy_build, conn)
+            print(f"legacy      {t_old:8.3f}s  {len(old)} outfits  {args.history / t_old:10.0f} rows/s")
+            cols = list(old.columns)
+            same = len(old) == len(new) and np.allclose(
+                old[cols[2:]].astype(float).to_numpy(), new[cols[2:]].astype(float).to_numpy()
+            ) and (old[cols[:2]].to_numpy() == new[cols[:2]].to_numpy()).all()
+            print(f"speedup     {t_old / t_new:8.1f}x  identical={same}")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
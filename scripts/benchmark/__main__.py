@@ -0,0 +1,34 @@
+# scripts/benchmark/__main__.py
+# The whole suite into one result file:
+#   python -m scripts.benchmark [--quick] [--out benchmark.json]
+# then, between two commits:
+#   python -m scripts.benchmark.compare old.json new.json
+import argparse
+from scripts.benchmark import recommend, load
+from scripts.benchmark.common import environment, write_json
+
+QUICK_SIZES = [10, 100, 1000]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--quick", action="store_true", help=f"sizes {QUICK_SIZES}, fewer repeats, a short load run")
+    ap.add_argument("--model", choices=["train", "current", "none"], default="train")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--out", default="benchmark.json")
+    args = ap.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else recommend.SIZES
+    repeat = 5 if args.quick else recommend.REPEAT
+    duration = 5 if args.quick else 20
+    write_json({
+        "environment": environment(),
+        "config": {"sizes": sizes, "history": recommend.HISTORY, "repeat": repeat, "model": args.model,
+                   "clients": args.clients, "duration": duration},
+        "recommend": recommend.sweep(sizes, recommend.HISTORY, repeat, model=args.model),
+        "load": load.run(clients=args.clients, duration=duration, model=args.model),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
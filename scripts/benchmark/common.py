@@ -0,0 +1,101 @@
+# scripts/benchmark/common.py
+# Shared by the benchmark scripts: where the repo is, the environment block
+# every result file starts with, and running the app against a seeded
+# database in a scratch directory.
+import os
+import sys
+import json
+import shutil
+import contextlib
+import platform
+import subprocess
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+
+# ranking model files copied into the scratch directory, so the benchmark
+# scores with the same model as the app
+MODEL_FILES = ["ml_model.json", "ml_model.pkl", "event_encoder.pkl", "weather_encoder.pkl"]
+
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "time": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def percentiles(values_ms):
+    if not len(values_ms):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(values_ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+
+
+def prepare_workdir(path, db_path, model="train"):
+    # a working directory for the app (its own uploads/, embeddings/ and
+    # thumbnails/) with a ranking model:
+    #   train    fitted on the seeded history, so runs on different commits compare
+    #   current  a copy of the repo's model files, if any
+    #   none     untrained: every outfit scores 0.5
+    os.makedirs(path, exist_ok=True)
+    if model == "current":
+        for name in MODEL_FILES:
+            if (ROOT / name).exists():
+                shutil.copy2(ROOT / name, os.path.join(path, name))
+    elif model == "train":
+        train_ranker(db_path, path)
+    return path
+
+
+def train_ranker(db_path, workdir):
+    import joblib
+    import train_model
+    from compiled_model import export, EXPORT_PATH
+    from database import make_engine, raw_connection
+    from scripts.benchmark.seed import database_url
+    engine = make_engine(database_url(db_path))
+    try:
+        with raw_connection(engine) as conn:
+            df = train_model.build_training_set(conn)
+    finally:
+        engine.dispose()
+    if df.empty or df["target"].nunique() < 2:
+        return False
+    with contextlib.redirect_stdout(sys.stderr):
+        model, le_event, le_weather = train_model.train(df)
+    joblib.dump(le_event, os.path.join(workdir, train_model.EVENT_ENCODER_PATH))
+    joblib.dump(le_weather, os.path.join(workdir, train_model.WEATHER_ENCODER_PATH))
+    joblib.dump(model, os.path.join(workdir, train_model.MODEL_PATH))
+    export(model, le_event, le_weather, path=os.path.join(workdir, EXPORT_PATH))
+    return True
+
+
+def app_env(db_url, **extra):
+    # environment for a child process that imports app from ROOT
+    env = dict(os.environ, SMARTOUTFIT_DATABASE_URL=db_url, **extra)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def write_json(data, out):
+    text = json.dumps(data, indent=2)
+    if out in (None, "-"):
+        print(text)
+        return
+    with open(out, "w") as f:
+        f.write(text + "\n")
+    print(f"Results written to {out}", file=sys.stderr)
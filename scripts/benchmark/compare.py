@@ -0,0 +1,78 @@
+# scripts/benchmark/compare.py
+# Differences between two benchmark result files.
+#   python -m scripts.benchmark.compare OLD.json NEW.json [--threshold 0.10]
+# Latencies, memory and errors are better lower, throughput (rps) higher.
+# Exits with status 1 when any metric got worse by more than --threshold.
+import sys
+import json
+import argparse
+
+THRESHOLD = 0.10
+# noise floor: changes smaller than this (ms / KB / MB) are never regressions
+MIN_DELTA = 0.5
+COMPARED = ("_ms", "_kb", "_mb", "rps", "errors")
+
+
+def flatten(result):
+    # {"recommend items=1000 cold.p50_ms": 12.3, "load /api/recommend p95_ms": ...}
+    metrics = {}
+
+    def walk(prefix, node):
+        for key, value in node.items():
+            name = f"{prefix}.{key}" if prefix else key
+            if isinstance(value, dict):
+                walk(name, value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool) and key.endswith(COMPARED):
+                metrics[name] = value
+
+    for r in result.get("recommend", []):
+        walk(f"recommend items={r['items']}", {k: v for k, v in r.items() if k != "pairs"})
+        for p in r.get("pairs", []):
+            walk(f"recommend items={r['items']} {p['event']}/{p['weather']}", p)
+    if "load" in result:
+        load = result["load"]
+        walk("load", {k: v for k, v in load.items() if k != "endpoints"})
+        for endpoint, e in load.get("endpoints", {}).items():
+            walk(f"load {endpoint}", e)
+    return metrics
+
+
+def compare(old, new, threshold=THRESHOLD):
+    a, b = flatten(old), flatten(new)
+    rows, regressions = [], []
+    for name in sorted(a.keys() & b.keys()):
+        before, after = a[name], b[name]
+        change = (after - before) / before if before else (0.0 if after == before else float("inf"))
+        worse = -change if name.endswith("rps") else change
+        regressed = worse > threshold and abs(after - before) >= MIN_DELTA
+        rows.append((name, before, after, change, regressed))
+        if regressed:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD)
+    ap.add_argument("--all", action="store_true", help="list per-pair metrics too")
+    args = ap.parse_args()
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"old: {old['environment'].get('commit')}  new: {new['environment'].get('commit')}")
+    rows, regressions = compare(old, new, args.threshold)
+    for name, before, after, change, regressed in rows:
+        if not args.all and "/" in name.split(" ")[-1] and name.startswith("recommend"):
+            continue
+        print(f"{'!' if regressed else ' '} {name:<60} {before:>12.3f} {after:>12.3f} {change:>+8.1%}")
+    if regressions:
+        print(f"{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
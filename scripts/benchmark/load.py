@@ -0,0 +1,172 @@
+# scripts/benchmark/load.py
+# Concurrent load against the HTTP endpoints.
+#   python -m scripts.benchmark.load [--url http://host:port] [--items 1000] [--history 5000]
+#                                    [--clients 8] [--duration 10] [--model train|current|none]
+#                                    [--server "CMD"] [--out FILE]
+#
+# Without --url a seeded database is served by a local server in a child
+# process (the Flask development server, or --server with {port} in place
+# of the port, e.g. "gunicorn -c gunicorn.conf.py -b 127.0.0.1:{port}"). Each
+# client is a thread in a closed loop: send one request from MIX, wait for
+# the answer, repeat until --duration is over. /api/recommend writes history
+# rows, so point --url only at a server whose data may change.
+import os
+import sys
+import json
+import time
+import socket
+import random
+import shlex
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from collections import defaultdict
+from scripts.benchmark.common import environment, percentiles, prepare_workdir, app_env, write_json
+from scripts.benchmark.seed import seed, database_url, EVENTS, WEATHERS
+
+# (weight, method, path); recommend bodies get a random (event, weather)
+MIX = [
+    (6, "POST", "/api/recommend"),
+    (2, "GET", "/api/items"),
+    (1, "GET", "/api/history?limit=50"),
+    (1, "GET", "/api/cache_stats"),
+]
+STARTUP_TIMEOUT = 60
+REQUEST_TIMEOUT = 60
+
+DEV_SERVER = [sys.executable, "-c", "import sys; from app import app; app.run(port=int(sys.argv[1]), threaded=True)"]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(url, proc):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            urllib.request.urlopen(url + "/api/cache_stats", timeout=2).read()
+            return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not answer within {STARTUP_TIMEOUT}s")
+
+
+def _request(url, method, path, rng):
+    body, headers = None, {}
+    if path == "/api/recommend":
+        body = json.dumps({"event": rng.choice(EVENTS), "weather": rng.choice(WEATHERS)}).encode()
+        headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(url + path, data=body, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=REQUEST_TIMEOUT) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+
+def drive(url, clients, duration, seed=0):
+    # -> {endpoint: [(latency ms, status)]}, wall seconds
+    weights = [w for w, _, _ in MIX]
+    samples = defaultdict(list)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(n):
+        rng = random.Random(seed + n)
+        local = defaultdict(list)
+        while time.monotonic() < deadline:
+            _, method, path = rng.choices(MIX, weights)[0]
+            start = time.perf_counter()
+            status = _request(url, method, path, rng)
+            local[path.split("?")[0]].append(((time.perf_counter() - start) * 1000, status))
+        with lock:
+            for endpoint, values in local.items():
+                samples[endpoint].extend(values)
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, wall):
+    endpoints = {}
+    for endpoint, values in sorted(samples.items()):
+        ok = [ms for ms, status in values if status is not None and status < 400]
+        endpoints[endpoint] = dict({
+            "requests": len(values),
+            "errors": len(values) - len(ok),
+            "rps": round(len(values) / wall, 2),
+        }, **percentiles(ok))
+    total = sum(len(v) for v in samples.values())
+    errors = sum(e["errors"] for e in endpoints.values())
+    return {"requests": total, "errors": errors, "rps": round(total / wall, 2), "seconds": round(wall, 2),
+            "endpoints": endpoints}
+
+
+def run(url=None, clients=8, duration=10, n_items=1000, n_history=5000, model="train", server=None):
+    if url:
+        return dict(summarize(*drive(url, clients, duration)), url=url)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, n_items, n_history)
+        prepare_workdir(tmp, db_path, model)
+        port = _free_port()
+        cmd = shlex.split(server.format(port=port)) if server else DEV_SERVER + [str(port)]
+        log = open(os.path.join(tmp, "server.log"), "w")
+        proc = subprocess.Popen(cmd, cwd=tmp, env=app_env(database_url(db_path)), stdout=log, stderr=subprocess.STDOUT)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_until_up(url, proc)
+            result = summarize(*drive(url, clients, duration))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+            log.close()
+        return dict(result, server=server or "flask development server", items=n_items)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url")
+    ap.add_argument("--items", type=int, default=1000)
+    ap.add_argument("--history", type=int, default=5000)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--model", choices=["train", "current", "none"], default="train")
+    ap.add_argument("--server", help="server command with {port}, default: the Flask development server")
+    ap.add_argument("--out", default="-")
+    args = ap.parse_args()
+
+    result = run(args.url, args.clients, args.duration, args.items, args.history, args.model, args.server)
+    for endpoint, e in result["endpoints"].items():
+        print(f"{endpoint:<20} {e['requests']:>6} req  {e['errors']:>4} err  {e['rps']:8.1f}/s  "
+              f"p50 {e['p50_ms'] or 0:8.2f}  p95 {e['p95_ms'] or 0:8.2f}  p99 {e['p99_ms'] or 0:8.2f} ms", file=sys.stderr)
+    write_json({
+        "environment": environment(),
+        "config": {"clients": args.clients, "duration": args.duration, "items": args.items,
+                   "history": args.history, "model": args.model},
+        "load": result,
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# scripts/benchmark/recommend.py
+# recommend_outfits latency and memory for every (event, weather) pair as
+# the wardrobe grows.
+#   python -m scripts.benchmark.recommend [--sizes 10,100,1000,10000] [--history 5000]
+#                                         [--repeat 20] [--model train|current|none]
+#                                         [--no-cache] [--out FILE]
+#
+# Each size gets a freshly seeded database and its own process, so module
+# state (wardrobe arrays, caches, novelty index) and peak RSS belong to that
+# size alone. Per pair it records:
+#   cold_ms   first call: enumerate and score every candidate
+#   warm_*    later calls (served from the ranking cache unless --no-cache)
+#   alloc_kb  peak Python allocation of a cold call (tracemalloc, separate run)
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from scripts.benchmark.common import environment, percentiles, prepare_workdir, app_env, write_json
+from scripts.benchmark.seed import seed, database_url, EVENTS, WEATHERS
+
+SIZES = [10, 100, 1000, 10000]
+HISTORY = 5000
+REPEAT = 20
+
+
+def _ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def measure(repeat):
+    # runs in the child process; the database comes from SMARTOUTFIT_DATABASE_URL
+    import resource
+    start = time.perf_counter()
+    from app import app
+    from recommender import recommend_outfits, ranking_cache, current_model
+    from novelty import novelty_index
+    from wardrobe import wardrobe
+    import_ms = _ms(start)
+
+    pairs = []
+    with app.app_context():
+        start = time.perf_counter()
+        wardrobe.view()
+        novelty_index.load()
+        current_model()
+        load_ms = _ms(start)
+        recommend_outfits(EVENTS[0], WEATHERS[0])   # builds the compatibility matrix
+        ranking_cache.clear()
+
+        for event in EVENTS:
+            for weather in WEATHERS:
+                start = time.perf_counter()
+                outfits = recommend_outfits(event, weather)
+                cold_ms = _ms(start)
+                warm = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    recommend_outfits(event, weather)
+                    warm.append(_ms(start))
+
+                ranking_cache.clear()
+                tracemalloc.start()
+                recommend_outfits(event, weather)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                pairs.append(dict(
+                    {"event": event, "weather": weather, "outfits": len(outfits), "cold_ms": round(cold_ms, 3)},
+                    **{f"warm_{k}": v for k, v in percentiles(warm).items()},
+                    alloc_kb=round(peak / 1024, 1),
+                ))
+
+    cold = [p["cold_ms"] for p in pairs]
+    return {
+        "import_ms": round(import_ms, 1),
+        "load_ms": round(load_ms, 1),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "cold": percentiles(cold),
+        "warm_p50_ms": percentiles([p["warm_p50_ms"] for p in pairs])["p50_ms"],
+        "max_alloc_kb": max(p["alloc_kb"] for p in pairs),
+        "pairs": pairs,
+    }
+
+
+def run_size(n_items, n_history, repeat, no_cache, model, tmp):
+    workdir = os.path.join(tmp, f"items_{n_items}")
+    os.makedirs(workdir)
+    db_path = os.path.join(workdir, "bench.db")
+    start = time.perf_counter()
+    counts = seed(db_path, n_items, n_history)
+    seed_s = time.perf_counter() - start
+    prepare_workdir(workdir, db_path, model)
+
+    out = os.path.join(workdir, "result.json")
+    extra = {"SMARTOUTFIT_RANK_CACHE_SIZE": "0"} if no_cache else {}
+    subprocess.run([sys.executable, "-m", "scripts.benchmark.recommend", "--child", out, "--repeat", str(repeat)],
+                   cwd=workdir, env=app_env(database_url(db_path), **extra), check=True)
+    with open(out) as f:
+        result = json.load(f)
+    return dict({"items": n_items, "history": counts["history"], "seed_s": round(seed_s, 2)}, **result)
+
+
+def sweep(sizes=SIZES, n_history=HISTORY, repeat=REPEAT, no_cache=False, model="train"):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            r = run_size(n, n_history, repeat, no_cache, model, tmp)
+            print(f"items={n:>6}  cold p50 {r['cold']['p50_ms']:9.2f} ms  p95 {r['cold']['p95_ms']:9.2f} ms  "
+                  f"warm p50 {r['warm_p50_ms']:7.3f} ms  alloc {r['max_alloc_kb']:9.0f} KB  rss {r['max_rss_mb']:6.0f} MB",
+                  file=sys.stderr)
+            results.append(r)
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    ap.add_argument("--history", type=int, default=HISTORY)
+    ap.add_argument("--repeat", type=int, default=REPEAT)
+    ap.add_argument("--model", choices=["train", "current", "none"], default="train")
+    ap.add_argument("--no-cache", action="store_true", help="disable the ranking cache (bounded search path)")
+    ap.add_argument("--out", default="-")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        with open(args.child, "w") as f:
+            json.dump(measure(args.repeat), f)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    write_json({
+        "environment": environment(),
+        "config": {"sizes": sizes, "history": args.history, "repeat": args.repeat, "model": args.model,
+                   "ranking_cache": not args.no_cache},
+        "recommend": sweep(sizes, args.history, args.repeat, args.no_cache, args.model),
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
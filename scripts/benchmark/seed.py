@@ -0,0 +1,96 @@
+# scripts/benchmark/seed.py
+# A synthetic wardrobe in a fresh SQLite file, with the app's schema.
+#   python -m scripts.benchmark.seed DB [--items 1000] [--history 5000] [--seed 0]
+#
+# Items are spread evenly over the CATEGORY_MAP categories, with a share of
+# favourites and random wear counts; history rows are 2-3 item outfits
+# spread over the last HISTORY_DAYS days, so part of them fall inside the
+# novelty window. Migrations are marked as applied: the rows already have
+# the shape they produce.
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+from categories import CATEGORY_MAP
+from models import db, ClothingItem, OutfitHistory, OutfitHistoryItem, WardrobeState, SchemaMigration
+from migrations import MIGRATIONS
+from database import make_engine, DB_PATH
+
+EVENTS = ["casual", "formal", "party", "date", "traditional"]
+WEATHERS = ["clear", "cold", "rainy", "windy"]
+HISTORY_DAYS = 30
+FAVORITE_SHARE = 0.2
+INSERT_CHUNK = 10_000
+
+
+def database_url(path):
+    return "sqlite:///" + os.path.abspath(path)
+
+
+def _chunks(rows):
+    for i in range(0, len(rows), INSERT_CHUNK):
+        yield rows[i:i + INSERT_CHUNK]
+
+
+def seed(path, n_items, n_history, seed=0):
+    for stale in (path, path + "-wal", path + "-shm"):   # a leftover WAL would replay into the new file
+        if os.path.exists(stale):
+            os.remove(stale)
+    rng = np.random.default_rng(seed)
+    categories = sorted(CATEGORY_MAP)
+    now = datetime.utcnow()
+
+    items = [{
+        "id": i,
+        "filename": f"synthetic_{i}.jpg",
+        "path": f"uploads/synthetic_{i}.jpg",
+        "embedding_path": "embeddings/vectors.f32",
+        "category": categories[i % len(categories)],
+        "color": "unknown",
+        "times_worn": int(rng.integers(0, 6)),
+        "favorited": bool(rng.random() < FAVORITE_SHARE),
+    } for i in range(1, n_items + 1)]
+
+    history, history_items = [], []
+    for h in range(1, (n_history if n_items else 0) + 1):
+        ids = rng.choice(n_items, size=min(n_items, int(rng.integers(2, 4))), replace=False) + 1
+        created_at = now - timedelta(days=float(rng.random()) * HISTORY_DAYS)
+        history.append({
+            "id": h,
+            "event": EVENTS[rng.integers(len(EVENTS))],
+            "weather": WEATHERS[rng.integers(len(WEATHERS))],
+            "items_used": ",".join(map(str, ids)),
+            "justification": "synthetic",
+            "created_at": created_at,
+        })
+        history_items.extend({"history_id": h, "position": n, "item_id": int(i), "created_at": created_at}
+                             for n, i in enumerate(ids))
+
+    engine = make_engine(database_url(path))
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for table, rows in ((ClothingItem, items), (OutfitHistory, history), (OutfitHistoryItem, history_items)):
+            for chunk in _chunks(rows):
+                conn.execute(table.__table__.insert(), chunk)
+        conn.execute(WardrobeState.__table__.insert(), [{"id": 1, "version": 1}])
+        conn.execute(SchemaMigration.__table__.insert(), [{"name": fn.__name__, "applied_at": now} for fn in MIGRATIONS])
+    engine.dispose()
+    return {"items": n_items, "history": len(history), "history_items": len(history_items)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("db")
+    ap.add_argument("--items", type=int, default=1000)
+    ap.add_argument("--history", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if os.path.abspath(args.db) == DB_PATH:
+        sys.exit("Refusing to overwrite the app database")
+    counts = seed(args.db, args.items, args.history, args.seed)
+    print(f"Seeded {args.db}: {counts['items']} items, {counts['history']} history rows")
+
+
+if __name__ == "__main__":
+    main()
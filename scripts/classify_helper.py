@@ -1,6 +1,11 @@
 # scripts/classify_helper.py
+import os
 import json
+import logging
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import torch
 from torchvision import transforms, models
 from PIL import Image
@@ -11,29 +16,80 @@ CLASSES_PATH = Path("models/classes.json")
 IMG_SIZE = 224
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+MEAN, STD = [0.485,0.456,0.406], [0.229,0.224,0.225]
 _transform = transforms.Compose([
     transforms.Resize((IMG_SIZE, IMG_SIZE)),
     transforms.ToTensor(),
-    transforms.Normalize([0.485,0.456,0.406],[0.229,0.224,0.225])
+    transforms.Normalize(MEAN, STD)
 ])
 
-_model = None
-_classes = None
+EXPORT_MANIFEST = Path("models/classifier_export.json")
+# auto: the fastest artifact recorded by export_classifier.py; or one of
+# eager, torchscript, onnx
+BACKEND = os.environ.get("SMARTOUTFIT_CLASSIFIER_BACKEND", "auto")
+# intra-op threads per process (0 keeps torch's default of one per core);
+# set it to cores / workers when several server workers share a machine
+TORCH_THREADS = int(os.environ.get("SMARTOUTFIT_TORCH_THREADS", 0))
 
-def load_classifier():
-    global _model, _classes
-    if _model is not None:
-        return _model, _classes
+log = logging.getLogger(__name__)
+
+# === BACKENDS ===
+# Each backend maps a normalized float (n, 3, H, W) batch to
+# (logits, pooled penultimate features).
+
+def _forward(model, x):
+    # same as MobileNetV2.forward, but also returns the pooled penultimate
+    # features that feed the classifier head; these are the item embeddings
+    feats = nn.functional.adaptive_avg_pool2d(model.features(x), (1, 1)).flatten(1)
+    return model.classifier(feats), feats
+
+class EagerBackend:
+    name = "eager"
+
+    def __init__(self, module):
+        self.module = module
+
+    def __call__(self, x):
+        with torch.no_grad():
+            return _forward(self.module, x.to(device))
+
+class TorchScriptBackend:
+    name = "torchscript"
+
+    def __init__(self, path, engine=None):
+        if engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+        self.module = torch.jit.load(str(path), map_location="cpu")
+
+    def __call__(self, x):
+        with torch.inference_mode():
+            return self.module(x)
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = TORCH_THREADS
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+
+    def __call__(self, x):
+        logits, feats = self.session.run(None, {"input": x.numpy()})
+        return torch.from_numpy(logits), torch.from_numpy(feats)
+
+def build_eager():
+    # the fp32 MobileNetV2 from MODEL_PATH -> (module, classes)
     if not MODEL_PATH.exists():
         raise FileNotFoundError(f"Classifier model not found at {MODEL_PATH}. Please run train_classifier.py")
     data = torch.load(str(MODEL_PATH), map_location=device)
     # Try to load classes from saved state or separate json
     if CLASSES_PATH.exists():
         with open(CLASSES_PATH) as f:
-            _classes = json.load(f)
+            classes = json.load(f)
     else:
-        _classes = data.get("classes", None)
-        if _classes is None:
+        classes = data.get("classes", None)
+        if classes is None:
             raise RuntimeError("No classes info found. Re-run training to produce classes.json")
 
     # build model skeleton
@@ -44,18 +100,137 @@ def load_classifier():
         backbone = models.mobilenet_v2(pretrained=False)
         in_features = backbone.last_channel
 
-    backbone.classifier = nn.Sequential(nn.Dropout(0.2), nn.Linear(in_features, len(_classes)))
+    backbone.classifier = nn.Sequential(nn.Dropout(0.2), nn.Linear(in_features, len(classes)))
     backbone.load_state_dict(data["state_dict"])
     backbone.to(device)
     backbone.eval()
-    _model = backbone
+    return backbone, classes
+
+def read_manifest():
+    # the export manifest, or None if missing or written for an older MODEL_PATH
+    try:
+        with open(EXPORT_MANIFEST) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not MODEL_PATH.exists() or manifest.get("source_mtime_ns") != MODEL_PATH.stat().st_mtime_ns:
+        return None
+    return manifest
+
+def _open_backend(name, manifest):
+    if name == "eager":
+        module, classes = build_eager()
+        return EagerBackend(module), classes
+    if manifest is None or name not in manifest["artifacts"]:
+        raise FileNotFoundError(f"No current {name} export; run python -m scripts.export_classifier")
+    path = EXPORT_MANIFEST.parent / manifest["artifacts"][name]
+    if name == "torchscript":
+        return TorchScriptBackend(path, manifest.get("quantized_engine")), manifest["classes"]
+    if name == "onnx":
+        return OnnxBackend(path), manifest["classes"]
+    raise ValueError(f"Unknown classifier backend {name!r}")
+
+_model = None
+_classes = None
+_load_lock = threading.Lock()
+
+def load_classifier():
+    # safe to call from several threads; only the first one loads
+    if _model is not None:
+        return _model, _classes
+    with _load_lock:
+        if _model is not None:
+            return _model, _classes
+        return _load_classifier()
+
+def _load_classifier():
+    global _model, _classes
+    if TORCH_THREADS:
+        torch.set_num_threads(TORCH_THREADS)
+    if BACKEND != "auto":
+        backend, classes = _open_backend(BACKEND, read_manifest())
+    else:
+        # exported artifacts are CPU-only; a stale or missing export means eager
+        manifest = read_manifest() if device.type == "cpu" else None
+        ranking = list(manifest["ranking"]) if manifest else []
+        if "eager" not in ranking:
+            ranking.append("eager")
+        for name in ranking:
+            try:
+                backend, classes = _open_backend(name, manifest)
+                break
+            except (ImportError, OSError, RuntimeError) as e:
+                if name == ranking[-1]:
+                    raise
+                log.warning("classifier backend %s unavailable (%s), trying the next one", name, e)
+    log.info("classifier backend: %s", backend.name)
+    # classes first: readers check _model without the lock
+    _classes = classes
+    _model = backend
     return _model, _classes
 
-def predict_category(image_path):
+# === BATCHED INFERENCE ===
+DECODE_THREADS = int(os.environ.get("SMARTOUTFIT_DECODE_THREADS", min(8, os.cpu_count() or 1)))
+_decode_pool = None
+_decode_pool_lock = threading.Lock()
+
+def _decode(image_path):
+    try:
+        return _transform(Image.open(image_path).convert("RGB"))
+    except Exception:
+        return None
+
+def _decode_all(paths):
+    global _decode_pool
+    if len(paths) == 1:
+        return [_decode(paths[0])]
+    if _decode_pool is None:
+        with _decode_pool_lock:
+            if _decode_pool is None:
+                _decode_pool = ThreadPoolExecutor(max_workers=DECODE_THREADS, thread_name_prefix="decode")
+    return list(_decode_pool.map(_decode, paths))
+
+def _predict(x):
+    # one forward pass over a normalized (n, 3, H, W) batch -> [(category, float32 embedding)]
     model, classes = load_classifier()
-    img = Image.open(image_path).convert("RGB")
-    x = _transform(img).unsqueeze(0).to(device)
-    with torch.no_grad():
-        out = model(x)
-        _, pred = torch.max(out, 1)
-    return classes[pred.item()]
+    out, feats = model(x)
+    _, pred = torch.max(out, 1)
+    feats = feats.cpu().numpy().astype("float32")
+    return [(classes[p], feats[n]) for n, p in enumerate(pred.tolist())]
+
+def predict_with_embeddings(paths):
+    # one forward pass for the whole batch -> [(category, float32 embedding)];
+    # unreadable images give None
+    tensors = _decode_all(list(paths))
+    ok = [i for i, t in enumerate(tensors) if t is not None]
+    results = [None] * len(tensors)
+    if not ok:
+        return results
+    for i, r in zip(ok, _predict(torch.stack([tensors[i] for i in ok]))):
+        results[i] = r
+    return results
+
+def predict_arrays(images):
+    # same as predict_with_embeddings for images already decoded and resized
+    # to IMG_SIZE x IMG_SIZE (uint8, n x H x W x 3), e.g. in worker processes
+    x = torch.from_numpy(np.ascontiguousarray(images)).permute(0, 3, 1, 2).float().div_(255)
+    mean = torch.tensor(MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(STD).view(1, 3, 1, 1)
+    return _predict((x - mean) / std)
+
+def predict_categories(paths):
+    return [r and r[0] for r in predict_with_embeddings(paths)]
+
+def get_embedding(image_path):
+    result = predict_with_embeddings([image_path])[0]
+    if result is None:
+        raise ValueError(f"Could not read image {image_path}")
+    return result[1]
+
+def predict_category(image_path):
+    # uploads are batched by the app's classification pool, which calls
+    # predict_with_embeddings; this is for one-off callers
+    category = predict_categories([image_path])[0]
+    if category is None:
+        raise ValueError(f"Could not read image {image_path}")
+    return category
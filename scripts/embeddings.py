@@ -0,0 +1,36 @@
+# scripts/embeddings.py
+# Maintenance for the shared embedding store.
+#   python -m scripts.embeddings compact    drop tombstoned rows
+#   python -m scripts.embeddings backfill   embed items that have no vector yet
+import sys
+from app import app, embedding_store
+from models import ClothingItem
+from scripts.classify_helper import predict_with_embeddings
+
+BATCH_SIZE = 32
+
+def compact():
+    removed = embedding_store.compact()
+    print(f"Compacted embedding store: removed {removed} rows, {len(embedding_store)} live.")
+
+def backfill():
+    with app.app_context():
+        missing = [(it.id, it.path) for it in ClothingItem.query.all() if it.id not in embedding_store]
+    done = 0
+    for start in range(0, len(missing), BATCH_SIZE):
+        batch = missing[start:start + BATCH_SIZE]
+        results = predict_with_embeddings([path for _, path in batch])
+        ok = [(item_id, r[1]) for (item_id, _), r in zip(batch, results) if r is not None]
+        if ok:
+            embedding_store.add_many([i for i, _ in ok], [v for _, v in ok])
+        done += len(ok)
+    print(f"Backfilled {done} of {len(missing)} items without embeddings.")
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "compact":
+        compact()
+    elif cmd == "backfill":
+        backfill()
+    else:
+        raise SystemExit("usage: python -m scripts.embeddings compact|backfill")
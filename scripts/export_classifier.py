@@ -0,0 +1,180 @@
+# scripts/export_classifier.py
+# CPU inference artifacts for the garment classifier, run after train_classifier.py:
+#   python -m scripts.export_classifier [--calibration 256] [--max-drop 0.01] [--no-onnx]
+#
+# - torchscript: MobileNetV2 statically quantized to int8 (fused conv+bn+relu,
+#   calibrated on training images) and traced
+# - onnx: the fp32 graph for ONNX Runtime, if torch can export it and
+#   onnxruntime is installed
+#
+# Every backend is compared with the eager fp32 model on the validation split
+# (accuracy, agreement, embedding cosine, latency), and classifier_export.json
+# records them fastest first. load_classifier() takes the first one that
+# opens; backends losing more than --max-drop accuracy are left out.
+import sys
+import json
+import time
+import argparse
+import statistics
+import torch
+from torch import nn
+from torch.ao import quantization as tq
+from torch.utils.data import DataLoader, Subset
+from torchvision import datasets
+from torchvision.models.quantization import mobilenet_v2 as quantizable_mobilenet_v2
+from scripts import classify_helper as ch
+from scripts.train_classifier import DATA_DIR, split_indices
+
+TORCHSCRIPT_NAME = "garment_classifier.int8.pt"
+ONNX_NAME = "garment_classifier.onnx"
+LATENCY_BATCHES = (1, 16)
+LATENCY_RUNS = 20
+
+class Embedder(nn.Module):
+    # (logits, pooled features) like classify_helper._forward; quant/dequant
+    # are identities until the model is converted, and the head stays fp32
+    def __init__(self, model):
+        super().__init__()
+        self.quant = getattr(model, "quant", nn.Identity())
+        self.features = model.features
+        self.dequant = getattr(model, "dequant", nn.Identity())
+        self.classifier = model.classifier
+
+    def forward(self, x):
+        x = self.dequant(self.features(self.quant(x)))
+        feats = nn.functional.adaptive_avg_pool2d(x, (1, 1)).flatten(1)
+        return self.classifier(feats), feats
+
+# ---------- export ----------
+
+def quantize(eager, calibration):
+    engine = torch.backends.quantized.engine
+    model = quantizable_mobilenet_v2(weights=None, quantize=False)
+    model.classifier = nn.Sequential(nn.Dropout(0.2), nn.Linear(model.last_channel, eager.classifier[1].out_features))
+    model.load_state_dict(eager.state_dict())
+    model.eval()
+    model.fuse_model()
+    embedder = Embedder(model).eval()
+    embedder.qconfig = tq.get_default_qconfig(engine)
+    embedder.classifier.qconfig = None
+    tq.prepare(embedder, inplace=True)
+    with torch.no_grad():
+        for x in calibration:
+            embedder(x)
+    tq.convert(embedder, inplace=True)
+    with torch.no_grad():
+        traced = torch.jit.trace(embedder, calibration[0][:1])
+    return torch.jit.freeze(traced), engine
+
+def export_onnx(eager, example, path):
+    # False when this torch cannot export (e.g. the onnx package is missing);
+    # ONNX is optional, so any exporter failure only skips it
+    try:
+        torch.onnx.export(Embedder(eager).eval(), example, str(path), dynamo=False,
+                          input_names=["input"], output_names=["logits", "embedding"],
+                          dynamic_axes={"input": {0: "n"}, "logits": {0: "n"}, "embedding": {0: "n"}},
+                          opset_version=17)
+    except Exception as e:
+        print(f"Skipping ONNX export: {e}")
+        return False
+    return True
+
+# ---------- comparison ----------
+
+def evaluate(backend, batches, reference=None):
+    correct = total = 0
+    preds, embeddings = [], []
+    for x, labels in batches:
+        logits, feats = backend(x)
+        pred = logits.argmax(1).cpu()
+        correct += (pred == labels).sum().item()
+        total += len(labels)
+        preds.append(pred)
+        embeddings.append(feats.cpu().float())
+    result = {"accuracy": correct / total, "preds": torch.cat(preds), "embeddings": torch.cat(embeddings)}
+    if reference is not None:
+        result["agreement"] = (result["preds"] == reference["preds"]).float().mean().item()
+        result["min_cosine"] = nn.functional.cosine_similarity(result["embeddings"], reference["embeddings"]).min().item()
+    return result
+
+def latency_ms(backend, images, batch_size):
+    x = images[:batch_size]
+    backend(x)   # warm-up
+    times = []
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        backend(x)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calibration", type=int, default=256, help="training images used to calibrate int8 ranges")
+    ap.add_argument("--max-drop", type=float, default=0.01, help="largest accepted accuracy loss vs eager")
+    ap.add_argument("--no-onnx", action="store_true")
+    args = ap.parse_args()
+
+    if ch.TORCH_THREADS:
+        torch.set_num_threads(ch.TORCH_THREADS)
+    if not DATA_DIR.exists():
+        sys.exit(f"Calibration and validation need the training dataset at {DATA_DIR}")
+    eager, classes = ch.build_eager()
+    eager = eager.cpu()
+
+    folder = datasets.ImageFolder(str(DATA_DIR), transform=ch._transform)
+    train_idx, val_idx = split_indices(len(folder))
+    calibration = [x for x, _ in DataLoader(Subset(folder, train_idx[:args.calibration]), batch_size=32)]
+    val_batches = list(DataLoader(Subset(folder, val_idx), batch_size=32))
+    if not val_batches:
+        sys.exit("The validation split is empty")
+
+    out_dir = ch.EXPORT_MANIFEST.parent
+    scripted, engine = quantize(eager, calibration)
+    scripted.save(str(out_dir / TORCHSCRIPT_NAME))
+    artifacts = {"torchscript": TORCHSCRIPT_NAME}
+    if not args.no_onnx and export_onnx(eager, calibration[0][:1], out_dir / ONNX_NAME):
+        artifacts["onnx"] = ONNX_NAME
+
+    backends = {"eager": ch.EagerBackend(eager), "torchscript": ch.TorchScriptBackend(out_dir / TORCHSCRIPT_NAME, engine)}
+    if "onnx" in artifacts:
+        try:
+            backends["onnx"] = ch.OnnxBackend(out_dir / ONNX_NAME)
+        except ImportError:
+            print("onnxruntime is not installed; the ONNX export is kept but not compared")
+
+    images = torch.cat([x for x, _ in val_batches] + calibration)[:max(LATENCY_BATCHES)]
+    reference = evaluate(backends["eager"], val_batches)
+    results = {}
+    print(f"{len(val_idx)} validation images, torch_threads={torch.get_num_threads()}, quantized engine={engine}")
+    print(f"{'backend':<12}{'accuracy':>9}{'agree':>8}{'min cos':>9}" + "".join(f"{f'bs={b} ms':>11}" for b in LATENCY_BATCHES))
+    for name, backend in backends.items():
+        r = reference if name == "eager" else evaluate(backend, val_batches, reference)
+        results[name] = {
+            "accuracy": r["accuracy"],
+            "agreement": r.get("agreement", 1.0),
+            "min_cosine": r.get("min_cosine", 1.0),
+            "latency_ms": {str(b): latency_ms(backend, images, b) for b in LATENCY_BATCHES},
+        }
+        res = results[name]
+        print(f"{name:<12}{res['accuracy']:>9.3f}{res['agreement']:>8.3f}{res['min_cosine']:>9.4f}"
+              + "".join(f"{res['latency_ms'][str(b)]:>11.2f}" for b in LATENCY_BATCHES))
+
+    # single images are the common case (uploads); ties go to eager
+    accepted = [n for n, r in results.items() if reference["accuracy"] - r["accuracy"] <= args.max_drop]
+    ranking = sorted(accepted, key=lambda n: (results[n]["latency_ms"]["1"], n != "eager"))
+    manifest = {
+        "source_mtime_ns": ch.MODEL_PATH.stat().st_mtime_ns,
+        "classes": classes,
+        "quantized_engine": engine,
+        "artifacts": artifacts,
+        "ranking": ranking,
+        "results": results,
+    }
+    tmp = ch.EXPORT_MANIFEST.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    tmp.replace(ch.EXPORT_MANIFEST)
+    print(f"Backend order: {', '.join(ranking)} -> {ch.EXPORT_MANIFEST}")
+
+if __name__ == "__main__":
+    main()
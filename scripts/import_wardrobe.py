@@ -0,0 +1,202 @@
+# scripts/import_wardrobe.py
+# Bulk import of a directory tree of images into the wardrobe.
+#   python -m scripts.import_wardrobe DIR [--workers N] [--batch 32] [--commit-every 1000] [--copy]
+#
+# Worker processes read, hash, decode and resize each image; files whose hash
+# is already in the wardrobe are skipped before decoding, so an interrupted
+# import can simply be rerun. The main process classifies and embeds the
+# decoded images in batches and inserts the items in chunked transactions.
+# With --copy the files are copied into uploads/ instead of referenced in place.
+#
+# Only light imports at module level: spawned workers import this module.
+import io
+import os
+import sys
+import time
+import hashlib
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+from PIL import Image
+
+EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+BATCH_SIZE = 32
+COMMIT_EVERY = 1000
+TASK_SIZE = 16   # files per worker task
+
+def find_images(root):
+    for dirpath, _, names in os.walk(root):
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in EXTENSIONS:
+                yield os.path.join(dirpath, name)
+
+# ---------- worker processes ----------
+
+_known = frozenset()
+_img_size = 224
+_copy_to = None
+
+def _init_worker(known, img_size, copy_to):
+    global _known, _img_size, _copy_to
+    _known, _img_size, _copy_to = known, img_size, copy_to
+
+def _load(path):
+    # -> (path, stored path, content hash, uint8 image or None, error or None)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return path, path, None, None, str(e)
+    content_hash = hashlib.sha256(data).hexdigest()
+    if content_hash in _known:
+        return path, path, content_hash, None, None
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("RGB", (2 * _img_size, 2 * _img_size))   # JPEG: decode at reduced scale
+        img = img.convert("RGB").resize((_img_size, _img_size), Image.BILINEAR)
+        array = np.asarray(img, dtype=np.uint8)
+    except Exception as e:
+        return path, path, content_hash, None, str(e)
+    stored = path
+    if _copy_to:
+        stored = os.path.join(_copy_to, f"{content_hash[:12]}_{os.path.basename(path)}")
+        with open(stored, "wb") as f:
+            f.write(data)
+    return path, stored, content_hash, array, None
+
+def _load_many(paths):
+    return [_load(p) for p in paths]
+
+def _bounded_map(pool, fn, tasks, window):
+    # like pool.map, but at most `window` tasks in flight so decoded images
+    # never pile up faster than the classifier consumes them
+    tasks = iter(tasks)
+    pending = deque(pool.submit(fn, t) for t in itertools.islice(tasks, window))
+    while pending:
+        result = pending.popleft().result()
+        for t in itertools.islice(tasks, 1):
+            pending.append(pool.submit(fn, t))
+        yield result
+
+# ---------- progress ----------
+
+class Progress:
+    def __init__(self, total, out=sys.stderr, width=30):
+        self.total, self.out, self.width = total, out, width
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def update(self, n):
+        self.done += n
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        frac = self.done / self.total if self.total else 1.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        bar = "#" * int(frac * self.width)
+        self.out.write(f"\r[{bar:<{self.width}}] {self.done}/{self.total} {rate:7.1f} img/s  ETA {eta:5.0f}s")
+        self.out.flush()
+
+    def close(self):
+        self.out.write("\n")
+
+# ---------- import ----------
+
+def import_directory(root, workers=None, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, copy=False):
+    from app import app, UPLOAD_FOLDER
+    from embedding_store import embedding_store
+    from models import db, ClothingItem
+    from wardrobe import wardrobe
+    from scripts import classify_helper as ch
+
+    paths = list(find_images(root))
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    with app.app_context():
+        known = frozenset(h for (h,) in db.session.query(ClothingItem.content_hash).filter(ClothingItem.content_hash.isnot(None)))
+    ch.load_classifier()
+
+    stats = {"added": 0, "skipped": 0, "failed": 0}
+    timings = {"classify": 0.0, "insert": 0.0}
+    seen = set(known)
+    decoded, rows = [], []
+
+    def classify():
+        start = time.perf_counter()
+        results = ch.predict_arrays(np.stack([d[3] for d in decoded]))
+        timings["classify"] += time.perf_counter() - start
+        rows.extend((d, r) for d, r in zip(decoded, results))
+        decoded.clear()
+
+    def insert():
+        start = time.perf_counter()
+        with app.app_context():
+            items = [ClothingItem(
+                filename=f"{content_hash[:12]}_{os.path.basename(path)}",
+                path=stored,
+                embedding_path=embedding_store.vectors_path,
+                category=category,
+                color="unknown",
+                times_worn=0,
+                favorited=False,
+                content_hash=content_hash
+            ) for (path, stored, content_hash, _, _), (category, _) in rows]
+            db.session.add_all(items)
+            db.session.flush()
+            # vectors first: a failed commit only leaves unreferenced rows in the store
+            embedding_store.add_many([it.id for it in items], np.stack([emb for _, (_, emb) in rows]))
+            pending = wardrobe.stage(changed=items)
+            db.session.commit()
+            wardrobe.apply(pending)
+        timings["insert"] += time.perf_counter() - start
+        stats["added"] += len(rows)
+        rows.clear()
+
+    copy_to = os.path.abspath(UPLOAD_FOLDER) if copy else None
+    progress = Progress(len(paths))
+    ctx = multiprocessing.get_context("spawn")
+    tasks = [paths[i:i + TASK_SIZE] for i in range(0, len(paths), TASK_SIZE)]
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(known, ch.IMG_SIZE, copy_to)) as pool:
+        for results in _bounded_map(pool, _load_many, tasks, window=4 * workers):
+            for path, stored, content_hash, array, error in results:
+                if error is not None:
+                    stats["failed"] += 1
+                    print(f"\nFailed for {path}: {error}", file=sys.stderr)
+                elif content_hash in seen:
+                    stats["skipped"] += 1
+                else:
+                    seen.add(content_hash)
+                    decoded.append((path, stored, content_hash, array, None))
+                if len(decoded) >= batch_size:
+                    classify()
+                if len(rows) >= commit_every:
+                    insert()
+            progress.update(len(results))
+        if decoded:
+            classify()
+        if rows:
+            insert()
+    progress.close()
+
+    elapsed = time.perf_counter() - progress.start
+    print(f"Imported {stats['added']} items, skipped {stats['skipped']} already in the wardrobe, "
+          f"{stats['failed']} failed, in {elapsed:.1f}s ({len(paths) / elapsed if elapsed else 0:.1f} files/s; "
+          f"classify {timings['classify']:.1f}s, insert {timings['insert']:.1f}s, {workers} decode workers)")
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("root")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE)
+    ap.add_argument("--commit-every", type=int, default=COMMIT_EVERY)
+    ap.add_argument("--copy", action="store_true", help="copy files into uploads/")
+    args = ap.parse_args()
+    if not os.path.isdir(args.root):
+        sys.exit(f"Not a directory: {args.root}")
+    import_directory(args.root, args.workers, args.batch, args.commit_every, args.copy)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,21 @@
 # scripts/train_classifier.py
+#   python -m scripts.train_classifier [--cache] [--rebuild-cache] [--workers N] [--epochs N]
+# With --cache, every image is decoded and resized once into a uint8
+# memory-mapped shard (CACHE_DIR); epochs then read raw pixels and augment on
+# tensors instead of re-decoding JPEGs. The shard is rebuilt when files in
+# DATA_DIR change.
 import os
 import json
+import time
+import hashlib
+import argparse
 from pathlib import Path
+import numpy as np
+from PIL import Image
 from torchvision import datasets, transforms, models
 import torch
 from torch import nn, optim
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset, Subset
 
 # === CONFIG ===
 DATA_DIR = Path("scripts/dataset_classifier")
@@ -13,37 +23,164 @@ SAVE_DIR = Path("models")
 SAVE_DIR.mkdir(parents=True, exist_ok=True)
 SAVE_PATH = SAVE_DIR / "garment_classifier.pth"
 CLASSES_PATH = SAVE_DIR / "classes.json"
+CACHE_DIR = Path("scripts/dataset_cache")
 
 BATCH_SIZE = 24
 LR = 1e-4
 EPOCHS = 6
-NUM_WORKERS = 2  # adjust for your machine
 IMG_SIZE = 224
+PREFETCH_FACTOR = 4
+SPLIT_SEED = 0
+
+def _available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+# one core is left for the training loop itself
+NUM_WORKERS = int(os.environ.get("SMARTOUTFIT_TRAIN_WORKERS", max(1, _available_cores() - 1)))
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+MEAN, STD = [0.485,0.456,0.406], [0.229,0.224,0.225]
+
 transform = transforms.Compose([
     transforms.Resize((IMG_SIZE, IMG_SIZE)),
     transforms.RandomHorizontalFlip(),
     transforms.ColorJitter(0.15,0.15,0.15,0.05),
     transforms.ToTensor(),
-    transforms.Normalize([0.485,0.456,0.406],[0.229,0.224,0.225])
+    transforms.Normalize(MEAN, STD)
+])
+# validation images are only resized and normalized, never augmented
+val_transform = transforms.Compose([
+    transforms.Resize((IMG_SIZE, IMG_SIZE)),
+    transforms.ToTensor(),
+    transforms.Normalize(MEAN, STD)
+])
+
+# the same steps for cached uint8 (3, H, W) tensors
+tensor_transform = transforms.Compose([
+    transforms.RandomHorizontalFlip(),
+    transforms.ColorJitter(0.15,0.15,0.15,0.05),
+    transforms.ConvertImageDtype(torch.float32),
+    transforms.Normalize(MEAN, STD)
+])
+tensor_val_transform = transforms.Compose([
+    transforms.ConvertImageDtype(torch.float32),
+    transforms.Normalize(MEAN, STD)
 ])
 
+# === CACHED DATASET ===
+def _fingerprint(samples):
+    h = hashlib.sha256()
+    for path, label in samples:
+        st = os.stat(path)
+        h.update(f"{path}|{label}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+def _decode(path):
+    # ImageFolder loader: (IMG_SIZE, IMG_SIZE, 3) uint8 array
+    with Image.open(path) as img:
+        img.draft("RGB", (2 * IMG_SIZE, 2 * IMG_SIZE))   # JPEG: decode at reduced scale
+        return np.asarray(img.convert("RGB").resize((IMG_SIZE, IMG_SIZE), Image.BILINEAR), dtype=np.uint8)
+
+def _as_list(batch):
+    return batch
+
+def build_cache(folder, workers, rebuild=False):
+    # decode + resize every image once into images.npy (N, H, W, 3) uint8 and
+    # labels.npy; decoding runs in DataLoader workers. Reused while meta.json
+    # matches the dataset's paths, sizes and mtimes.
+    meta_path = CACHE_DIR / "meta.json"
+    fingerprint = _fingerprint(folder.samples)
+    if not rebuild and meta_path.exists():
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("fingerprint") == fingerprint and meta.get("img_size") == IMG_SIZE:
+            return CACHE_DIR
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    n = len(folder.samples)
+    start = time.perf_counter()
+    raw = datasets.ImageFolder(str(DATA_DIR), loader=_decode)
+    images = np.lib.format.open_memmap(CACHE_DIR / "images.tmp.npy", mode="w+", dtype=np.uint8,
+                                       shape=(n, IMG_SIZE, IMG_SIZE, 3))
+    loader = DataLoader(raw, batch_size=64, num_workers=workers, collate_fn=_as_list)
+    i = 0
+    for batch in loader:
+        for array, _ in batch:
+            images[i] = array
+            i += 1
+    images.flush()
+    del images
+    os.replace(CACHE_DIR / "images.tmp.npy", CACHE_DIR / "images.npy")
+    np.save(CACHE_DIR / "labels.npy", np.array(folder.targets, dtype=np.int64))
+    with open(meta_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "img_size": IMG_SIZE, "classes": folder.classes, "n": n}, f)
+    print(f"Cached {n} images in {time.perf_counter() - start:.1f}s -> {CACHE_DIR}")
+    return CACHE_DIR
+
+class CachedImages(Dataset):
+    # (uint8 image tensor, label) pairs read from the memory-mapped shard; the
+    # map is opened lazily so each DataLoader worker opens its own
+    def __init__(self, cache_dir, transform):
+        self.cache_dir = Path(cache_dir)
+        self.labels = np.load(self.cache_dir / "labels.npy")
+        self.transform = transform
+        self._images = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, i):
+        if self._images is None:
+            self._images = np.load(self.cache_dir / "images.npy", mmap_mode="r")
+        img = torch.from_numpy(np.array(self._images[i])).permute(2, 0, 1)
+        return self.transform(img), int(self.labels[i])
+
+def split_indices(n):
+    # 85/15 train/validation split with a fixed seed, so export_classifier.py
+    # evaluates on the same validation images
+    generator = torch.Generator().manual_seed(SPLIT_SEED)
+    train_idx, val_idx = torch.utils.data.random_split(range(n), [int(0.85 * n), n - int(0.85 * n)], generator=generator)
+    return list(train_idx), list(val_idx)
+
+def _loader(ds, shuffle, workers):
+    kwargs = {"num_workers": workers, "pin_memory": device.type == "cuda"}
+    if workers > 0:
+        kwargs.update(persistent_workers=True, prefetch_factor=PREFETCH_FACTOR)
+    return DataLoader(ds, batch_size=BATCH_SIZE, shuffle=shuffle, **kwargs)
+
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cache", action="store_true", help="train from a pre-decoded uint8 shard")
+    ap.add_argument("--rebuild-cache", action="store_true")
+    ap.add_argument("--workers", type=int, default=NUM_WORKERS)
+    ap.add_argument("--epochs", type=int, default=EPOCHS)
+    args = ap.parse_args()
+
     if not DATA_DIR.exists():
         raise SystemExit(f"Please create dataset at {DATA_DIR} with subfolders per class")
-    dataset = datasets.ImageFolder(str(DATA_DIR), transform=transform)
-    classes = dataset.classes
+    folder = datasets.ImageFolder(str(DATA_DIR))
+    classes = folder.classes
     if len(classes) < 2:
         raise SystemExit("Need at least 2 classes with images to train")
 
-    train_size = int(0.85 * len(dataset))
-    val_size = len(dataset) - train_size
-    train_ds, val_ds = torch.utils.data.random_split(dataset, [train_size, val_size])
+    if args.cache or args.rebuild_cache:
+        cache_dir = build_cache(folder, args.workers, rebuild=args.rebuild_cache)
+        train_base = CachedImages(cache_dir, tensor_transform)
+        val_base = CachedImages(cache_dir, tensor_val_transform)
+    else:
+        train_base = datasets.ImageFolder(str(DATA_DIR), transform=transform)
+        val_base = datasets.ImageFolder(str(DATA_DIR), transform=val_transform)
+
+    train_idx, val_idx = split_indices(len(folder))
+    train_ds, val_ds = Subset(train_base, train_idx), Subset(val_base, val_idx)
 
-    train_loader = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True, num_workers=NUM_WORKERS)
-    val_loader = DataLoader(val_ds, batch_size=BATCH_SIZE, shuffle=False, num_workers=NUM_WORKERS)
+    train_loader = _loader(train_ds, True, args.workers)
+    val_loader = _loader(val_ds, False, args.workers)
+    print(f"device={device} workers={args.workers} cached={args.cache or args.rebuild_cache}")
 
     # load mobilenetv2 backbone
     try:
@@ -63,24 +200,31 @@ def main():
 
     best_val_acc = 0.0
 
-    for epoch in range(EPOCHS):
+    for epoch in range(args.epochs):
         backbone.train()
         running_loss = 0.0
         correct = 0
         total = 0
+        # data time: waiting for the next batch; compute time: the rest
+        data_time = compute_time = 0.0
+        mark = time.perf_counter()
         for imgs, labels in train_loader:
-            imgs = imgs.to(device)
-            labels = labels.to(device)
+            now = time.perf_counter()
+            data_time += now - mark
+            imgs = imgs.to(device, non_blocking=True)
+            labels = labels.to(device, non_blocking=True)
             optimizer.zero_grad()
             outputs = backbone(imgs)
             loss = criterion(outputs, labels)
             loss.backward()
             optimizer.step()
 
-            running_loss += loss.item() * imgs.size(0)
+            running_loss += loss.item() * imgs.size(0)   # .item() waits for the GPU
             _, preds = torch.max(outputs, 1)
             correct += (preds == labels).sum().item()
             total += imgs.size(0)
+            mark = time.perf_counter()
+            compute_time += mark - now
 
         train_acc = correct / total
         train_loss = running_loss / total
@@ -99,7 +243,8 @@ def main():
                 total += imgs.size(0)
         val_acc = correct / total if total > 0 else 0.0
 
-        print(f"Epoch {epoch+1}/{EPOCHS}  train_loss={train_loss:.4f}  train_acc={train_acc:.3f}  val_acc={val_acc:.3f}")
+        print(f"Epoch {epoch+1}/{args.epochs}  train_loss={train_loss:.4f}  train_acc={train_acc:.3f}  val_acc={val_acc:.3f}"
+              f"  data={data_time:.1f}s  compute={compute_time:.1f}s")
 
         if val_acc > best_val_acc:
             torch.save({"state_dict": backbone.state_dict(), "classes": classes}, str(SAVE_PATH))
@@ -110,6 +255,7 @@ def main():
     print("Training complete. Best val_acc:", best_val_acc)
     print("Saved model to:", SAVE_PATH)
     print("Saved classes to:", CLASSES_PATH)
+    print("For faster CPU inference run: python -m scripts.export_classifier")
 
 if __name__ == "__main__":
     main()
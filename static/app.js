@@ -1,11 +1,49 @@
 
 
 /* ---------------- API HELPER ---------------- */
+/* single-item writes made within BATCH_DELAY_MS of each other go to the
+   server together as one /api/batch request; each caller still gets its own
+   result ({ok: true} or {error}) */
+const BATCH_OPS = ['update_category', 'mark_worn', 'favorite', 'delete_item', 'delete_history'];
+const BATCH_DELAY_MS = 30;
+let batchQueue = [];
+
 async function api(path, opts = {}) {
+  if (opts.method === 'POST' && BATCH_OPS.includes(path)) {
+    return queueOp(Object.assign({ op: path }, JSON.parse(opts.body)));
+  }
   const res = await fetch('/api/' + path, opts);
   return res.json();
 }
 
+function queueOp(op) {
+  return new Promise((resolve, reject) => {
+    batchQueue.push({ op, resolve, reject });
+    if (batchQueue.length === 1) setTimeout(sendBatch, BATCH_DELAY_MS);
+  });
+}
+
+async function sendBatch() {
+  const queued = batchQueue;
+  batchQueue = [];
+  try {
+    const res = await fetch('/api/batch', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ops: queued.map(q => q.op) })
+    });
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.error || res.statusText);
+    queued.forEach((q, i) => q.resolve(data.results[i]));
+  } catch (err) {
+    queued.forEach(q => q.reject(err));
+  }
+}
+
+/* grid and outfit images use the server-side thumbnails */
+const THUMB_SIZE = 256;
+const thumb = url => url + (url.includes('?') ? '&' : '?') + 'size=' + THUMB_SIZE;
+
 /* ---------- CLOTHING TYPES ---------- */
 const CLOTHING_TYPES = [
   'top','shirt','t-shirt','blouse',
@@ -49,83 +87,159 @@ document.getElementById('uploadBtn').onclick = async () => {
   const fd = new FormData();
   fd.append('image', f);
 
-  await fetch('/api/upload', { method: 'POST', body: fd });
+  const res = await fetch('/api/upload', { method: 'POST', body: fd });
+  if (res.status === 503) return alert('Classifier is busy, please retry in a moment');
+  const data = await res.json();
+  if (data.duplicate) alert('This photo is already in your wardrobe');
+
   document.getElementById('imageInput').value = '';
   loadItems();
+  if (data.status === 'pending') waitForCategory(data.id);
 };
 
+/* classification runs in the background; refresh once it lands. The server
+   ends every upload as "done" or "unknown" (not recognised), so poll every
+   second for a minute, then every 5 s for up to 15 minutes */
+async function waitForCategory(id) {
+  for (let i = 0; i < 228; i++) {
+    await new Promise(r => setTimeout(r, i < 60 ? 1000 : 5000));
+    const st = await api('upload_status/' + id);
+    if (st.status === 'pending') continue;
+    await loadItems();
+    if (st.status === 'unknown') alert('This photo could not be recognised, please choose its category on its card');
+    return;
+  }
+  alert('This photo is still being classified; its category shows up when you reload the page');
+}
+
 /* ---------------- LOAD WARDROBE ---------------- */
-async function loadItems() {
-  const items = await api('items');
+/* the first load pages through /api/items; later loads ask only for what
+   changed since the version we have and patch those cards */
+const ITEMS_PAGE_SIZE = 500;
+let itemsVersion = null;
+
+/* clicks answered by one batch all call loadItems(); they share one
+   request in flight plus at most one more after it */
+let itemsLoading = null;
+let itemsReload = null;
+
+function loadItems() {
+  if (!itemsLoading) {
+    itemsLoading = fetchItems().finally(() => { itemsLoading = null; });
+    return itemsLoading;
+  }
+  if (!itemsReload) {
+    itemsReload = itemsLoading.catch(() => {}).then(() => {
+      itemsReload = null;
+      return loadItems();
+    });
+  }
+  return itemsReload;
+}
+
+async function fetchItems() {
+  if (itemsVersion === null) return loadAllItems();
+  const delta = await api('items?since=' + itemsVersion);
+  delta.deleted.forEach(id => {
+    const card = document.querySelector(`#items .card[data-id="${id}"]`);
+    if (card) card.remove();
+  });
+  delta.changed.forEach(putCard);
+  itemsVersion = delta.version;
+}
+
+async function loadAllItems() {
   const div = document.getElementById('items');
   div.innerHTML = '';
+  let after = 0, version = null;
+  for (;;) {
+    const res = await fetch(`/api/items?limit=${ITEMS_PAGE_SIZE}&after=${after}`);
+    if (version === null) version = Number(res.headers.get('X-Wardrobe-Version'));
+    (await res.json()).forEach(it => div.appendChild(itemCard(it)));
+    after = res.headers.get('X-Next-Cursor');
+    if (!after) break;
+  }
+  /* pages after the first may be newer; catch up from the first one's version */
+  itemsVersion = version;
+  return fetchItems();
+}
 
-  items.forEach(it => {
-    const card = document.createElement('div');
-    card.className = 'card';
+/* replace the item's card, or insert it in id order */
+function putCard(it) {
+  const div = document.getElementById('items');
+  const card = itemCard(it);
+  const old = div.querySelector(`.card[data-id="${it.id}"]`);
+  if (old) return old.replaceWith(card);
+  const next = [...div.children].find(c => Number(c.dataset.id) > it.id);
+  div.insertBefore(card, next || null);
+}
 
-    const img = document.createElement('img');
-    img.src = it.url;
+function itemCard(it) {
+  const card = document.createElement('div');
+  card.className = 'card';
+  card.dataset.id = it.id;
+
+  const img = document.createElement('img');
+  img.src = thumb(it.url);
+
+  const meta = document.createElement('div');
+  meta.className = 'meta';
+  meta.innerText = `${it.category} • worn: ${it.times_worn}`;
+
+  const select = document.createElement('select');
+  CLOTHING_TYPES.forEach(t => {
+    const o = document.createElement('option');
+    o.value = t;
+    o.innerText = t;
+    if (t === it.category) o.selected = true;
+    select.appendChild(o);
+  });
 
-    const meta = document.createElement('div');
-    meta.className = 'meta';
-    meta.innerText = `${it.category} • worn: ${it.times_worn}`;
-
-    const select = document.createElement('select');
-    CLOTHING_TYPES.forEach(t => {
-      const o = document.createElement('option');
-      o.value = t;
-      o.innerText = t;
-      if (t === it.category) o.selected = true;
-      select.appendChild(o);
+  select.onchange = async () => {
+    await api('update_category', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ item_id: it.id, category: select.value })
     });
+    loadItems();
+  };
+
+  const wornBtn = document.createElement('button');
+  wornBtn.innerText = '👣 Worn +1';
+  wornBtn.onclick = async () => {
+    await api('mark_worn', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ item_id: it.id })
+    });
+    loadItems();
+  };
+
+  const favBtn = document.createElement('button');
+  favBtn.innerText = it.favorited ? '⭐ Favorited' : '☆ Favorite';
+  favBtn.onclick = async () => {
+    await api('favorite', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ item_id: it.id })
+    });
+    loadItems();
+  };
+
+  const delBtn = document.createElement('button');
+  delBtn.innerText = '🗑 Delete';
+  delBtn.onclick = async () => {
+    if (!confirm('Delete this item?')) return;
+    await api('delete_item', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ item_id: it.id })
+    });
+    loadItems();
+  };
 
-    select.onchange = async () => {
-      await api('update_category', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ item_id: it.id, category: select.value })
-      });
-      loadItems();
-    };
-
-    const wornBtn = document.createElement('button');
-    wornBtn.innerText = '👣 Worn +1';
-    wornBtn.onclick = async () => {
-      await api('mark_worn', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ item_id: it.id })
-      });
-      loadItems();
-    };
-
-    const favBtn = document.createElement('button');
-    favBtn.innerText = it.favorited ? '⭐ Favorited' : '☆ Favorite';
-    favBtn.onclick = async () => {
-      await api('favorite', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ item_id: it.id })
-      });
-      loadItems();
-    };
-
-    const delBtn = document.createElement('button');
-    delBtn.innerText = '🗑 Delete';
-    delBtn.onclick = async () => {
-      if (!confirm('Delete this item?')) return;
-      await api('delete_item', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ item_id: it.id })
-      });
-      loadItems();
-    };
-
-    card.append(img, meta, select, wornBtn, favBtn, delBtn);
-    div.appendChild(card);
-  });
+  card.append(img, meta, select, wornBtn, favBtn, delBtn);
+  return card;
 }
 
 /* ---------------- GENERATE OUTFITS ---------------- */
@@ -163,7 +277,7 @@ document.getElementById('recommendBtn').onclick = async () => {
 
     o.items.forEach(it => {
       const img = document.createElement('img');
-      img.src = `/image/${it.id}`;
+      img.src = thumb(`/image/${it.id}`);
       imagesWrap.appendChild(img);
     });
 
@@ -182,15 +296,20 @@ document.getElementById('recommendBtn').onclick = async () => {
 
 /* ---------------- LOAD HISTORY ---------------- */
 /* ---------------- LOAD HISTORY ---------------- */
-async function loadHistory() {
-  const history = await api('history');
+// one page at a time; the server returns X-Next-Cursor while more pages exist
+async function loadHistory(before = null) {
+  const res = await fetch('/api/history' + (before ? '?before=' + encodeURIComponent(before) : ''));
+  const history = await res.json();
+  const next = res.headers.get('X-Next-Cursor');
   const div = document.getElementById('history');
 
   if (!div) return;
 
-  div.innerHTML = '';
+  if (!before) div.innerHTML = '';
+  const more = document.getElementById('historyMore');
+  if (more) more.remove();
 
-  if (!history || history.length === 0) {
+  if (!before && (!history || history.length === 0)) {
     div.innerHTML = `<div class="notice">No outfit history yet.</div>`;
     return;
   }
@@ -209,7 +328,7 @@ async function loadHistory() {
 
     entry.items.forEach(it => {
       const img = document.createElement('img');
-      img.src = it.url;
+      img.src = thumb(it.url);
       imagesWrap.appendChild(img);
     });
 
@@ -239,6 +358,14 @@ async function loadHistory() {
 
     div.appendChild(card);
   });
+
+  if (next) {
+    const moreBtn = document.createElement('button');
+    moreBtn.id = 'historyMore';
+    moreBtn.innerText = 'Load more';
+    moreBtn.onclick = () => loadHistory(next);
+    div.appendChild(moreBtn);
+  }
 }
 
 /* ---------------- INIT ---------------- */
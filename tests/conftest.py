@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# the app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# importing them creates data files relative to the working directory
+# (embeddings/store.json); keep those out of the tree
+os.chdir(tempfile.mkdtemp(prefix="smartoutfit-tests-"))
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder
+
+from compiled_model import FEATURES, CompiledModel, check_parity, export
+from recommender import _encode
+
+# The recommender scores with ml_model.json whenever it exists, so the export
+# must give the same probabilities as the pickled sklearn model it replaces,
+# also for events and weathers the model was never trained on.
+
+EVENTS = ["casual", "formal", "party"]
+WEATHERS = ["cold", "rainy", "sunny"]
+
+
+def _features(event, weather, n, rng):
+    return pd.DataFrame({
+        "event": event,
+        "weather": weather,
+        "favorite_count": rng.integers(0, 4, n),
+        "avg_times_worn": rng.random(n) * 20,
+        "unique_categories": rng.integers(1, 4, n),
+        "total_items": rng.integers(2, 4, n),
+    }, columns=FEATURES).astype(np.float64)
+
+
+@pytest.fixture(scope="module")
+def trained():
+    rng = np.random.default_rng(0)
+    le_event, le_weather = LabelEncoder().fit(EVENTS), LabelEncoder().fit(WEATHERS)
+    n = 500
+    X = _features(rng.integers(0, len(EVENTS), n), rng.integers(0, len(WEATHERS), n), n, rng)
+    logit = 0.8 * X["favorite_count"] - 0.1 * X["avg_times_worn"] + 0.5 * X["event"] + rng.normal(0, 0.5, n)
+    model = LogisticRegression().fit(X, (logit > 0).astype(int))
+    return model, le_event, le_weather
+
+
+@pytest.fixture
+def compiled(trained, tmp_path):
+    path = str(tmp_path / "ml_model.json")
+    export(*trained, path=path)
+    return CompiledModel.load(path)
+
+
+def test_export_matches_predict_proba(trained, compiled):
+    model = trained[0]
+    rng = np.random.default_rng(1)
+    X = _features(rng.integers(0, len(EVENTS), 1000), rng.integers(0, len(WEATHERS), 1000), 1000, rng)
+    assert np.allclose(compiled.predict_proba(X.to_numpy()), model.predict_proba(X), rtol=0, atol=1e-12)
+    assert np.allclose(compiled.score(X.to_numpy()), model.predict_proba(X)[:, 1], rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("event", EVENTS + ["wedding"])
+@pytest.mark.parametrize("weather", WEATHERS + ["snow"])
+def test_unseen_labels_score_like_the_pickle(trained, compiled, event, weather):
+    # the recommender encodes a label with _encode, which falls back to 0 for
+    # labels the encoder has not seen; both encoders must agree on every code
+    model, le_event, le_weather = trained
+    codes = _encode(le_event, event), _encode(le_weather, weather)
+    assert (_encode(compiled.le_event, event), _encode(compiled.le_weather, weather)) == codes
+
+    X = _features(*codes, 200, np.random.default_rng(2))
+    assert np.allclose(compiled.score(X.to_numpy()), model.predict_proba(X)[:, 1], rtol=0, atol=1e-12)
+
+
+def test_check_parity_rejects_a_different_model(trained, compiled):
+    model = trained[0]
+    assert check_parity(model, compiled) <= 1e-12
+    wrong = CompiledModel(compiled.w, compiled.b + 0.01, compiled.le_event.classes_, compiled.le_weather.classes_)
+    with pytest.raises(ValueError):
+        check_parity(model, wrong)
@@ -0,0 +1,101 @@
+import os
+import json
+import numpy as np
+import joblib
+from sklearn.linear_model import SGDClassifier
+from encoders import GrowingLabelEncoder
+from database import raw_connection
+from train_model import (
+    MODEL_PATH, EVENT_ENCODER_PATH, WEATHER_ENCODER_PATH, CHUNK_ROWS, FEATURES,
+    load_clothing, iter_pair_chunks, outfit_features, save_model,
+)
+
+# ------------------ INCREMENTAL TRAINING ------------------
+# Learns only from history rows added since the last run, with a
+# partial_fit-capable logistic model. The checkpoint records the highest
+# history id already learned from (ids only grow), and the model is replaced
+# atomically so a running app swaps it in on its next check.
+#
+# A model without partial_fit (e.g. from a full train_model.py run), or a
+# missing checkpoint, starts a fresh model over the whole history; fitted
+# encoders are kept so existing codes stay valid.
+
+CHECKPOINT_PATH = "train_state.json"
+CLASSES = np.array([0, 1])
+
+
+def new_model():
+    # alpha close to LogisticRegression's default C=1 for a few hundred samples;
+    # smaller values let the unscaled avg_times_worn weight run away
+    return SGDClassifier(loss="log_loss", alpha=1e-2, random_state=0)
+
+
+def _load(path):
+    try:
+        return joblib.load(path)
+    except FileNotFoundError:
+        return None
+
+
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(state):
+    tmp = CHECKPOINT_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+def load_state():
+    model, checkpoint = _load(MODEL_PATH), load_checkpoint()
+    if model is None or not hasattr(model, "partial_fit") or checkpoint is None:
+        model, checkpoint = new_model(), {"last_history_id": 0, "samples": 0}
+    le_event = GrowingLabelEncoder.from_encoder(_load(EVENT_ENCODER_PATH))
+    le_weather = GrowingLabelEncoder.from_encoder(_load(WEATHER_ENCODER_PATH))
+    return model, le_event, le_weather, checkpoint
+
+
+def update(conn, model, le_event, le_weather, checkpoint, chunk_rows=CHUNK_ROWS):
+    # one partial_fit per chunk of new history; returns the number of samples learned
+    clothing = load_clothing(conn)
+    learned = 0
+    for pairs in iter_pair_chunks(conn, chunk_rows, after_id=checkpoint["last_history_id"]):
+        df = outfit_features(pairs, clothing)
+        checkpoint["last_history_id"] = int(pairs["history_id"].iat[-1])
+        if df.empty:
+            continue
+        df["event_encoded"] = le_event.partial_fit(df["event"]).transform(df["event"])
+        df["weather_encoded"] = le_weather.partial_fit(df["weather"]).transform(df["weather"])
+        model.partial_fit(df[FEATURES].to_numpy(dtype=np.float64), df["target"].to_numpy(), classes=CLASSES)
+        learned += len(df)
+    checkpoint["samples"] += learned
+    return learned
+
+
+def main():
+    model, le_event, le_weather, checkpoint = load_state()
+    with raw_connection() as conn:
+        learned = update(conn, model, le_event, le_weather, checkpoint)
+
+    if not learned:
+        if hasattr(model, "coef_"):
+            save_checkpoint(checkpoint)   # skip rows whose items are all gone
+        print(f"No new outfit history after id {checkpoint['last_history_id']}; model unchanged.")
+        return
+
+    # model first, checkpoint second: a crash in between relearns a few rows
+    # rather than skipping them
+    save_model(model, le_event, le_weather)
+    save_checkpoint(checkpoint)
+    print(f"Learned {learned} new samples ({checkpoint['samples']} total, "
+          f"up to history id {checkpoint['last_history_id']}).")
+
+
+if __name__ == "__main__":
+    main()
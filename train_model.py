@@ -1,85 +1,143 @@
-import sqlite3
+import os
 import pandas as pd
 from sklearn.preprocessing import LabelEncoder
 from sklearn.linear_model import LogisticRegression
 import joblib
-import numpy as np
+from compiled_model import compile_checked, write_export
+from database import raw_connection
 
-# Connect DB
-conn = sqlite3.connect("instance/smartoutfit.db")
+MODEL_PATH = "ml_model.pkl"
+EVENT_ENCODER_PATH = "event_encoder.pkl"
+WEATHER_ENCODER_PATH = "weather_encoder.pkl"
 
-# Load tables
-history = pd.read_sql_query("SELECT * FROM outfit_history", conn)
-clothing = pd.read_sql_query("SELECT * FROM clothing_item", conn)
+# (history_id, item_id) pairs are streamed from SQLite this many rows at a
+# time, so building the training set needs memory for one chunk plus the
+# per-outfit features, not for the whole history
+CHUNK_ROWS = 200_000
 
-conn.close()
-
-# If no history, stop
-if history.empty:
-    print("No outfit history found.")
-    exit()
-
-# Prepare dataset
-rows = []
-
-for _, row in history.iterrows():
-    item_ids = list(map(int, row["items_used"].split(",")))
-
-    items = clothing[clothing["id"].isin(item_ids)]
-
-    if items.empty:
-        continue
-
-    favorite_count = items["favorited"].sum()
-    avg_times_worn = items["times_worn"].mean()
-    unique_categories = items["category"].nunique()
-    total_items = len(items)
-
-    # Target (implicit feedback)
-    target = 1 if avg_times_worn >= 1 else 0
-
-    rows.append({
-        "event": row["event"],
-        "weather": row["weather"],
-        "favorite_count": favorite_count,
-        "avg_times_worn": avg_times_worn,
-        "unique_categories": unique_categories,
-        "total_items": total_items,
-        "target": target
-    })
-
-df = pd.DataFrame(rows)
-
-if df.empty:
-    print("No valid training data.")
-    exit()
-
-# Encode categorical features
-le_event = LabelEncoder()
-le_weather = LabelEncoder()
-
-df["event_encoded"] = le_event.fit_transform(df["event"])
-df["weather_encoded"] = le_weather.fit_transform(df["weather"])
-
-X = df[[
+FEATURES = [
     "event_encoded",
     "weather_encoded",
     "favorite_count",
     "avg_times_worn",
     "unique_categories",
     "total_items"
-]]
+]
+
+PAIRS_QUERY = """
+    SELECT h.id AS history_id, h.event, h.weather, hi.item_id
+    FROM outfit_history h
+    JOIN outfit_history_item hi ON hi.history_id = h.id
+    WHERE h.id > ?
+    ORDER BY h.id, hi.position
+"""
+
+# ------------------ TRAINING SET ------------------
+
+def load_clothing(conn):
+    return pd.read_sql_query(
+        "SELECT id AS item_id, category, favorited, times_worn FROM clothing_item", conn
+    )
+
+
+def outfit_features(pairs, clothing):
+    # one row per outfit from its (history_id, item_id) pairs: a single join
+    # to the wardrobe and a single groupby; items deleted since are dropped
+    items = pairs.drop_duplicates(["history_id", "item_id"]).merge(clothing, on="item_id")
+    df = items.groupby("history_id", sort=False).agg(
+        event=("event", "first"),
+        weather=("weather", "first"),
+        favorite_count=("favorited", "sum"),
+        avg_times_worn=("times_worn", "mean"),
+        unique_categories=("category", "nunique"),
+        total_items=("item_id", "size"),
+    )
 
-y = df["target"]
-
-# Train model
-model = LogisticRegression()
-print("Training samples:", len(X))
-model.fit(X, y)
-
-# Save model & encoders
-joblib.dump(model, "ml_model.pkl")
-joblib.dump(le_event, "event_encoder.pkl")
-joblib.dump(le_weather, "weather_encoder.pkl")
-
-print("Model trained and saved successfully.")
+    # Target (implicit feedback)
+    df["target"] = (df["avg_times_worn"] >= 1).astype(int)
+    return df.reset_index(drop=True)
+
+
+def iter_pair_chunks(conn, chunk_rows=CHUNK_ROWS, after_id=0):
+    # pairs of history rows with id > after_id, in id order; chunks never
+    # split an outfit: the last history id of each chunk is held back and
+    # prepended to the next one
+    carry = None
+    for chunk in pd.read_sql_query(PAIRS_QUERY, conn, params=(after_id,), chunksize=chunk_rows):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        last = chunk["history_id"].iat[-1]
+        tail = chunk["history_id"] == last
+        carry = chunk[tail]
+        if not tail.all():
+            yield chunk[~tail]
+    if carry is not None and len(carry):
+        yield carry
+
+
+def build_training_set(conn, chunk_rows=CHUNK_ROWS):
+    clothing = load_clothing(conn)
+    parts = [outfit_features(pairs, clothing) for pairs in iter_pair_chunks(conn, chunk_rows)]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
+
+# ------------------ TRAINING ------------------
+
+def train(df):
+    # Encode categorical features
+    le_event = LabelEncoder()
+    le_weather = LabelEncoder()
+
+    df["event_encoded"] = le_event.fit_transform(df["event"])
+    df["weather_encoded"] = le_weather.fit_transform(df["weather"])
+
+    X = df[FEATURES]
+    y = df["target"]
+
+    model = LogisticRegression()
+    print("Training samples:", len(X))
+    model.fit(X, y)
+    return model, le_event, le_weather
+
+
+def save_model(model, le_event, le_weather):
+    # the compiled export is built and checked against sklearn before any
+    # file is touched, so a failed check leaves the previous model in place.
+    # Then every pickle is written to a temporary file and all are swapped in,
+    # in the order the app reads them: the pickles, then the export it prefers.
+    compiled = compile_checked(model, le_event, le_weather)
+    files = [(le_event, EVENT_ENCODER_PATH), (le_weather, WEATHER_ENCODER_PATH), (model, MODEL_PATH)]
+    for obj, path in files:
+        joblib.dump(obj, path + ".tmp")
+    for _, path in files:
+        os.replace(path + ".tmp", path)
+    write_export(compiled)
+
+
+def main():
+    with raw_connection() as conn:
+        has_history = conn.execute("SELECT 1 FROM outfit_history LIMIT 1").fetchone()
+        df = build_training_set(conn) if has_history else None
+
+    # If no history, stop
+    if df is None:
+        print("No outfit history found.")
+        return
+
+    if df.empty:
+        print("No valid training data.")
+        return
+
+    model, le_event, le_weather = train(df)
+
+    # Save model & encoders
+    save_model(model, le_event, le_weather)
+
+    print("Model trained and saved successfully.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import threading
+from collections import namedtuple
+import numpy as np
+from models import db, ClothingItem, WardrobeState, ItemTombstone
+from categories import NORM_CATEGORIES, NORM_CODE, normalize
+
+# ------------------ WARDROBE SNAPSHOT ------------------
+# Process-local copy of the columns the recommender and /api/items need,
+# stored as compact arrays indexed by row. Rows are kept in id order and
+# never reused; deleted rows are only marked dead until the next reload.
+#
+# A view is an immutable snapshot: once view() has handed out the arrays,
+# the next apply() works on copies of them (and by_cat is always replaced,
+# never mutated), so a recommendation never sees half of a change.
+#
+# WardrobeState.version is bumped inside every write transaction. A worker
+# that sees exactly its own bump applies the change in place; any other
+# difference means another worker wrote, and the snapshot is reloaded.
+# The same transaction stamps the new version on each changed item and on a
+# tombstone per removed one, which is what /api/items?since= reads.
+
+WardrobeView = namedtuple("WardrobeView", [
+    "version", "size", "ids", "category", "cat", "cat_codes", "norm", "favorited", "times_worn", "alive", "by_cat",
+])
+
+Pending = namedtuple("Pending", ["version", "changed", "removed"])
+
+
+def _row(item):
+    return (item.id, item.category, bool(item.favorited), item.times_worn or 0)
+
+
+class Wardrobe:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self._clear(0)
+
+    def _clear(self, capacity):
+        capacity = max(capacity, 64)
+        self.size = 0
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.cat = np.full(capacity, -1, dtype=np.int32)   # code of the exact category
+        self.cat_codes = {}   # exact category -> code, only ever added to
+        self.norm = np.full(capacity, -1, dtype=np.int8)
+        self.favorited = np.zeros(capacity, dtype=bool)
+        self.times_worn = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.category = []
+        self.row_of = {}
+        self.by_cat = {}
+        self._view = None
+
+    def _detach(self):
+        # before writing: leave the arrays of a handed-out view untouched
+        if self._view is None:
+            return
+        for name in ("ids", "cat", "norm", "favorited", "times_worn", "alive"):
+            setattr(self, name, getattr(self, name).copy())
+        self.category = list(self.category)
+        self.cat_codes = dict(self.cat_codes)
+        self._view = None
+
+    def _grow(self):
+        capacity = 2 * len(self.ids)
+        for name in ("ids", "cat", "norm", "favorited", "times_worn", "alive"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _set(self, r, category, favorited, times_worn):
+        norm = normalize(category)
+        self.category[r] = category
+        self.cat[r] = self.cat_codes.setdefault(category, len(self.cat_codes))
+        self.norm[r] = NORM_CODE[norm] if norm else -1
+        self.favorited[r] = favorited
+        self.times_worn[r] = times_worn
+
+    def _append(self, item_id, category, favorited, times_worn):
+        if self.size == len(self.ids):
+            self._grow()
+        r = self.size
+        self.size += 1
+        self.ids[r] = item_id
+        self.alive[r] = True
+        self.category.append(None)
+        self._set(r, category, favorited, times_worn)
+        self.row_of[item_id] = r
+
+    def _rebuild_by_cat(self, codes=None):
+        # by_cat is replaced, never mutated, like the arrays after _detach
+        by_cat = dict(self.by_cat)
+        norm = self.norm[:self.size]
+        alive = self.alive[:self.size]
+        for code in (range(len(NORM_CATEGORIES)) if codes is None else codes):
+            if code < 0:
+                continue
+            rows = np.flatnonzero(alive & (norm == code))
+            if len(rows):
+                by_cat[NORM_CATEGORIES[code]] = rows
+            else:
+                by_cat.pop(NORM_CATEGORIES[code], None)
+        self.by_cat = by_cat
+
+    # ---------- loading ----------
+
+    def _db_version(self):
+        return db.session.query(WardrobeState.version).filter(WardrobeState.id == 1).scalar() or 0
+
+    def reload(self):
+        version = self._db_version()
+        rows = (
+            db.session.query(
+                ClothingItem.id, ClothingItem.category, ClothingItem.favorited, ClothingItem.times_worn
+            )
+            .order_by(ClothingItem.id)
+            .all()
+        )
+        with self._lock:
+            self._clear(len(rows))
+            for item_id, category, favorited, times_worn in rows:
+                self._append(item_id, category, bool(favorited), times_worn or 0)
+            self._rebuild_by_cat()
+            self.version = version
+
+    def view(self):
+        if self.version != self._db_version():
+            self.reload()
+        with self._lock:
+            if self._view is None:
+                self._view = WardrobeView(
+                    self.version, self.size, self.ids, self.category, self.cat, self.cat_codes, self.norm,
+                    self.favorited, self.times_worn, self.alive, self.by_cat,
+                )
+            return self._view
+
+    # ---------- writes ----------
+
+    def init_state(self):
+        if db.session.get(WardrobeState, 1) is None:
+            db.session.add(WardrobeState(id=1, version=0))
+            db.session.commit()
+
+    def stage(self, changed=(), removed=()):
+        # call inside the write transaction, before commit
+        db.session.flush()
+        updated = (
+            db.session.query(WardrobeState)
+            .filter(WardrobeState.id == 1)
+            .update({WardrobeState.version: WardrobeState.version + 1}, synchronize_session=False)
+        )
+        if not updated:
+            db.session.add(WardrobeState(id=1, version=1))
+            db.session.flush()
+        version = self._db_version()
+        for it in changed:
+            it.version = version
+        for item_id in removed:
+            db.session.merge(ItemTombstone(item_id=item_id, version=version))
+        return Pending(version, [_row(it) for it in changed], list(removed))
+
+    def apply(self, pending):
+        # call after the write transaction committed
+        with self._lock:
+            if self.version != pending.version - 1:
+                self.version = None
+                return
+            self._detach()
+            touched = set()
+            for item_id, category, favorited, times_worn in pending.changed:
+                r = self.row_of.get(item_id)
+                if r is None:
+                    self._append(item_id, category, favorited, times_worn)
+                    touched.add(int(self.norm[self.row_of[item_id]]))
+                    continue
+                old = int(self.norm[r])
+                self._set(r, category, favorited, times_worn)
+                if self.norm[r] != old:
+                    touched.update((old, int(self.norm[r])))
+            for item_id in pending.removed:
+                r = self.row_of.pop(item_id, None)
+                if r is not None:
+                    self.alive[r] = False
+                    touched.add(int(self.norm[r]))
+            self._rebuild_by_cat(touched)
+            self.version = pending.version
+
+
+wardrobe = Wardrobe()
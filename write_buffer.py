@@ -0,0 +1,186 @@
+import os
+import atexit
+import logging
+import threading
+from collections import Counter
+from sqlalchemy import insert, text
+from models import db, ClothingItem, OutfitHistory, OutfitHistoryItem
+from wardrobe import wardrobe
+from metrics import span, observe_size
+
+# ------------------ WRITE-BEHIND BUFFER ------------------
+# /api/recommend, /api/mark_worn and /api/favorite hand their writes to this
+# buffer instead of committing per request. A flusher thread writes everything
+# queued in one transaction every FLUSH_SECONDS, or as soon as FLUSH_ROWS
+# writes are waiting:
+#   - history entries and their items as two bulk INSERTs
+#   - wear counts as UPDATE ... SET times_worn = times_worn + ?, one
+#     parameter set per item, so concurrent clicks add up instead of
+#     overwriting each other
+#   - favorite toggles the same way; two toggles of one item cancel out
+# Buffers are per process and lost if it is killed before a flush. A batch
+# whose transaction fails is put back and retried; while the database keeps
+# failing, history beyond MAX_BACKLOG entries is dropped, oldest first.
+# FLUSH_SECONDS=0 writes synchronously in the request.
+
+FLUSH_SECONDS = float(os.environ.get("SMARTOUTFIT_WRITE_FLUSH_SECONDS", 0.5))
+FLUSH_ROWS = int(os.environ.get("SMARTOUTFIT_WRITE_FLUSH_ROWS", 256))
+MAX_BACKLOG = int(os.environ.get("SMARTOUTFIT_WRITE_MAX_BACKLOG", 10_000))
+
+log = logging.getLogger(__name__)
+
+_ADD_WORN = text("UPDATE clothing_item SET times_worn = coalesce(times_worn, 0) + :n WHERE id = :id")
+_TOGGLE_FAVORITE = text("UPDATE clothing_item SET favorited = (coalesce(favorited, 0) + :n) % 2 WHERE id = :id")
+
+
+def write_counters(worn, toggles):
+    # {item id: wears to add}, {item id: favorite toggles}, in the current
+    # transaction; the caller stages and commits
+    if worn:
+        db.session.execute(_ADD_WORN, [{"id": i, "n": n} for i, n in worn.items()])
+    toggles = {i: n for i, n in toggles.items() if n % 2}
+    if toggles:
+        db.session.execute(_TOGGLE_FAVORITE, [{"id": i, "n": n} for i, n in toggles.items()])
+
+
+class WriteBuffer:
+    def __init__(self, app, interval=FLUSH_SECONDS, max_rows=FLUSH_ROWS, max_backlog=MAX_BACKLOG):
+        self.app = app
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_backlog = max_backlog
+        self.failures = 0   # flushes failed in a row
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._history = []       # (event, weather, justification, created_at, [item ids])
+        self._worn = Counter()   # item id -> wear count to add
+        self._toggles = Counter()  # item id -> favorite toggles
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        # once per process, like the classification pool
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._wake = threading.Event()
+            threading.Thread(target=self._run, name="write-buffer", daemon=True).start()
+            atexit.register(self.flush)
+            self._pid = os.getpid()
+
+    # ---------- queueing ----------
+
+    def add_history(self, event, weather, justification, created_at, item_ids):
+        with self._lock:
+            self._history.append((event, weather, justification, created_at, [int(i) for i in item_ids]))
+        self._queued()
+
+    def add_worn(self, item_id, n=1):
+        with self._lock:
+            self._worn[int(item_id)] += n
+        self._queued()
+
+    def toggle_favorite(self, item_id):
+        with self._lock:
+            self._toggles[int(item_id)] += 1
+        self._queued()
+
+    def _queued(self):
+        if self.interval <= 0:
+            self.flush()
+            return
+        self.start()
+        if self.backlog() >= self.max_rows:
+            self._wake.set()
+
+    def backlog(self):
+        return len(self._history) + len(self._worn) + len(self._toggles)
+
+    def item_writes(self):
+        # buffered wear counts and favorite toggles: the writes that change items
+        return len(self._worn) + len(self._toggles)
+
+    # ---------- flushing ----------
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # the batch was put back; retried on the next tick
+                log.exception("write buffer flush failed (%d in a row, %d writes waiting)",
+                              self.failures, self.backlog())
+
+    def _take(self):
+        with self._lock:
+            batch = self._history, self._worn, self._toggles
+            self._history, self._worn, self._toggles = [], Counter(), Counter()
+            return batch
+
+    def _put_back(self, history, worn, toggles):
+        with self._lock:
+            self._history[:0] = history
+            self._worn.update(worn)
+            self._toggles.update(toggles)
+            dropped = len(self._history) - self.max_backlog
+            if dropped > 0:
+                del self._history[:dropped]
+        if dropped > 0:
+            log.error("write buffer full: dropped the %d oldest history entries", dropped)
+
+    def flush(self):
+        # writes everything queued so far; returns once it is committed
+        with self._flush_lock:
+            history, worn, toggles = self._take()
+            toggles = {i: n for i, n in toggles.items() if n % 2}
+            if not (history or worn or toggles):
+                return 0
+            try:
+                pending = self._write(history, worn, toggles)
+            except Exception:
+                # nothing was committed, so nothing is written twice
+                self.failures += 1
+                self._put_back(history, worn, toggles)
+                raise
+            self.failures = 0
+            if pending is not None:
+                wardrobe.apply(pending)
+            rows = len(history) + len(worn) + len(toggles)
+            observe_size("write_buffer.flush", rows)
+            return rows
+
+    def _write(self, history, worn, toggles):
+        # one transaction; returns the wardrobe change to apply once committed.
+        # A fresh app context gives the flush its own session, also when
+        # called from inside a request
+        with self.app.app_context(), span("write_buffer.flush"):
+            try:
+                if history:
+                    ids = db.session.scalars(
+                        insert(OutfitHistory).returning(OutfitHistory.id, sort_by_parameter_order=True),
+                        [{"event": event, "weather": weather, "items_used": ",".join(map(str, item_ids)),
+                          "justification": justification, "created_at": created_at}
+                         for event, weather, justification, created_at, item_ids in history],
+                    ).all()
+                    item_rows = [
+                        {"history_id": history_id, "position": n, "item_id": item_id, "created_at": created_at}
+                        for history_id, (_, _, _, created_at, item_ids) in zip(ids, history)
+                        for n, item_id in enumerate(item_ids)
+                    ]
+                    if item_rows:
+                        db.session.execute(insert(OutfitHistoryItem), item_rows)
+
+                pending = None
+                if worn or toggles:
+                    write_counters(worn, toggles)
+                    changed = ClothingItem.query.filter(ClothingItem.id.in_(set(worn) | set(toggles))).all()
+                    pending = wardrobe.stage(changed=changed)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return pending